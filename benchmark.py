@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+#
+# This script measures how the scripts scale with the size of the dataset on synthetic exports (see generate_synthetic.py).
+# For every size and every stage, the wall time, the peak memory (RSS) and the throughput (transactions per second) are reported,
+# e.g. python benchmark.py --sizes 10000 100000 1000000 --report benchmark.csv
+# The stages are run as separate processes in a working directory (see ransomwhere/benchmark.py).
+#
+# The same as `python -m ransomwhere benchmark` (see ransomwhere/cli.py).
+
+
+from ransomwhere.cli import run_command
+
+
+if __name__ == "__main__":
+    run_command("benchmark")
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+#
+# This script computes the same top N ransomware families as compute_top_families.sh, but in one pass over the JSON file
+# and without sorting the whole table of families for every metric (see ransomwhere/topk.py).
+# To download the file you can run: curl -sL "https://api.ransomwhe.re/export" | jq --indent 0 '.result' > data.json
+#
+# The number of families (--top) and the metrics (--metrics, any of count, btc and usd) can be chosen.
+# Besides the tables in the terminal, the results can be saved into a csv file (--csv) or a JSON file (--json).
+#
+# With --cache, the totals are computed from the columnar cache of the JSON file (see ransomwhere/cache.py),
+# with --workers N (implies --cache) by N processes, each for a shard of the families (see ransomwhere/parallel.py).
+#
+# The same as `python -m ransomwhere top-families` (see ransomwhere/cli.py).
+
+
+from ransomwhere.cli import run_command
+
+
+if __name__ == "__main__":
+    run_command("top-families")
@@ -2,6 +2,7 @@
 #
 # This script comptutes the statistics for the top N ransomware families in the Ransomwhere dataset (available on https://api.ransomwhe.re/export).
 # To download the file you can run: curl -sL "https://api.ransomwhe.re/export" | jq --indent 0 '.result' > data.json
+# The file can also be compressed with gzip, bzip2 or xz (e.g. data.json.gz), it is then decompressed as a stream.
 #
 # The top N ransomware families are computed in terms of:
 # - The number of transactions
@@ -25,6 +26,27 @@ function usage() {
     echo -e "\tdata.json - the current up-to-date version of the dataset (available on: https://api.ransomwhe.re/export)"
 }
 
+function detect_compression() {
+    # Prints the compression of the file $1 (gzip, bzip2 or xz) detected from its first bytes, nothing for a plain file
+    case $(head -c 6 "$1" | od -An -tx1 | tr -d ' \n') in
+        1f8b*) echo "gzip" ;;
+        425a68*) echo "bzip2" ;;
+        fd377a585a00) echo "xz" ;;
+    esac
+}
+
+function jq_data() {
+    # Runs jq with the remaining arguments on the JSON file $1
+    # A compressed file is decompressed as a stream into jq (no uncompressed copy), see data_compression below
+    local data="$1"
+    shift
+    if [[ -n "$data_compression" ]]; then
+        "$data_compression" -dc "$data" | jq "$@"
+    else
+        jq "$@" "$data"
+    fi
+}
+
 function print_title() {
     echo -ne "\e[1;91m"
     echo -ne "$1"
@@ -40,16 +62,16 @@ function print_result() {
 function compute_stats() {
     # Expects the full JSON file (data.json)
 
-    jq -r '.[] | .family as $family | .transactions[] | [$family, .amount, .amountUSD] | @csv' "$1" | tr -d '"' |
+    jq_data "$1" -r '.[] | .family as $family | .transactions[] | [$family, .amount, .amountUSD] | @csv' | tr -d '"' |
         awk -F, -v bitcoin_factor="$BITCOIN_FACTOR" '
         {
             count[$1] += 1;
-            sumBTC[$1] += $2 / bitcoin_factor;
+            sumSatoshi[$1] += $2;  # Exact integer sums, converted to BTC at the end
             sumUSD[$1] += $3;
         }
         END {
             for (family in count) {
-                printf("%s,%d,%f,%.2f\n", family, count[family], sumBTC[family], sumUSD[family]);
+                printf("%s,%d,%f,%.2f\n", family, count[family], sumSatoshi[family] / bitcoin_factor, sumUSD[family]);
             }
         }'
 }
@@ -61,6 +83,9 @@ function compute_stats() {
 # Check if the provided file exists
 [[ -f "$1" ]] || { echo "File $1 does not exist." >&2 ; exit 1; }
 
+# The data can be compressed with gzip, bzip2 or xz (see jq_data)
+data_compression=$(detect_compression "$1")
+
 
 table_header="Family,Count,Sum (BTC),Sum (USD)"
 families=$(compute_stats "$1")
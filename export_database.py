@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+#
+# This script loads the JSON file from the Ransomwhere website into a SQLite database for ad-hoc queries with SQL
+# (normalized tables of families, addresses, address records and transactions, and the precomputed reports of run_stats.sh,
+# see ransomwhere/database.py for the schema).
+# To download the file you can run: curl -sL "https://api.ransomwhe.re/export" | jq --indent 0 '.result' > data.json
+#
+# The database is only rebuilt when the JSON file has changed, `run_stats.py --database` reads the reports from it.
+# Example: python export_database.py data.json
+#          sqlite3 data.json.sqlite "SELECT name, hash, time, amount_usd FROM transactions JOIN families ON families.id = family_id
+#                                    WHERE name = 'Conti' AND month LIKE '2021-%' AND amount_usd > 100000"
+#
+# The same as `python -m ransomwhere export-database` (see ransomwhere/cli.py).
+
+
+from ransomwhere.cli import run_command
+
+
+if __name__ == "__main__":
+    run_command("export-database")
@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+#
+# This script writes a synthetic export in the same JSON schema as the Ransomwhere dataset (see ransomwhere/synthetic.py).
+# The export can be used instead of data.json to see how the scripts scale with the size of the dataset, e.g.
+# python generate_synthetic.py 1000000 synthetic.json
+# The same seed always gives the same file.
+#
+# The same as `python -m ransomwhere generate` (see ransomwhere/cli.py).
+
+
+from ransomwhere.cli import run_command
+
+
+if __name__ == "__main__":
+    run_command("generate")
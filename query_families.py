@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+#
+# This script prints the number of unique addresses and the number of transactions for ransomware families of choice,
+# the same as `print_transactions_for_family` in run_stats.sh, but for any number of families at once.
+# To download the file you can run: curl -sL "https://api.ransomwhe.re/export" | jq --indent 0 '.result' > data.json
+#
+# The first run builds the columnar cache (see ransomwhere/cache.py) and the family index (see ransomwhere/family_index.py)
+# next to the JSON file, later runs only look up the families in the index without parsing the JSON file again.
+# Example: python query_families.py data.json Locky Conti WannaCry
+#
+# The same as `python -m ransomwhere query-families` (see ransomwhere/cli.py).
+
+
+from ransomwhere.cli import run_command
+
+
+if __name__ == "__main__":
+    run_command("query-families")
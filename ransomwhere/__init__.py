@@ -0,0 +1,5 @@
+# Python tooling for computing statistics on the Ransomwhere dataset (https://api.ransomwhe.re/export).
+# The scripts in the root of the repository (run_stats.py etc.) are thin wrappers around the modules in this package.
+
+# The Bitcoin amounts in Ransomwhere dataset are in Satoshi
+BITCOIN_FACTOR = 100000000
@@ -0,0 +1,6 @@
+# python -m ransomwhere COMMAND [options], see cli.py (e.g. `python -m ransomwhere stats data.json`)
+
+from ransomwhere.cli import main
+
+
+main()
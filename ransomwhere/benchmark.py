@@ -0,0 +1,84 @@
+# Scaling benchmark of the scripts on synthetic exports (see synthetic.py).
+#
+# For every size, a synthetic export is generated and every stage is run as a separate process,
+# so that the peak memory of the stage is measured on its own (ru_maxrss of the child from os.wait4, in KiB on Linux).
+# Stages:
+# - generate: generate_synthetic.py
+# - stats: run_stats.py (streaming parser)
+# - stats_cache_cold, stats_cache_warm: run_stats.py --cache (building the cache and memory-mapping it)
+# - stats_workers: run_stats.py --workers N
+# - render: render_plots.py (all figures, without the render cache)
+# - run_stats_sh, compute_top_families_sh: the shell scripts (optional, they are slow for large sizes)
+# The throughput is the number of transactions per second of wall time.
+
+import os
+import shutil
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from ransomwhere.report import format_csv
+
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = ("generate", "stats", "stats_cache_cold", "stats_cache_warm", "stats_workers", "render")
+SHELL_STAGES = ("run_stats_sh", "compute_top_families_sh")
+
+REPORT_HEADER = "Transactions,Stage,Wall Time (s),Peak RSS (MiB),Throughput (tx/s),Exit Code"
+REPORT_FORMAT = "%d,%s,%.3f,%.1f,%.0f,%d"
+
+Measurement = namedtuple("Measurement", ["transactions", "stage", "wall_time", "peak_rss", "throughput", "exit_code"])
+
+
+def run_measured(command, cwd):
+    # Runs the command and returns (wall time in seconds, peak RSS in MiB, exit code)
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - start
+    return wall_time, usage.ru_maxrss / 1024, os.waitstatus_to_exitcode(status)
+
+
+def _commands(stage, data, work_dir, workers):
+    python = [sys.executable]
+    cache_dir = os.path.join(work_dir, "data.json.cache")
+    if stage == "stats":
+        return python + [os.path.join(SCRIPT_DIR, "run_stats.py"), data]
+    if stage in ("stats_cache_cold", "stats_cache_warm"):
+        return python + [os.path.join(SCRIPT_DIR, "run_stats.py"), data, "--cache-dir", cache_dir]
+    if stage == "stats_workers":
+        return python + [os.path.join(SCRIPT_DIR, "run_stats.py"), data, "--cache-dir", cache_dir, "--workers", str(workers)]
+    if stage == "render":
+        return python + [os.path.join(SCRIPT_DIR, "render_plots.py"), "timeline_months.csv", "timeline_families.csv", "--output", "plots", "--no-cache"]
+    if stage == "run_stats_sh":
+        return ["bash", os.path.join(SCRIPT_DIR, "run_stats.sh"), data]
+    if stage == "compute_top_families_sh":
+        return ["bash", os.path.join(SCRIPT_DIR, "compute_top_families.sh"), data]
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def benchmark_size(num_transactions, work_dir, stages=STAGES, workers=4, seed=0):
+    # Yields a Measurement for every stage (in the given order) on a synthetic export with `num_transactions` transactions
+    os.makedirs(work_dir, exist_ok=True)
+    data = os.path.join(work_dir, "data.json")
+    if "generate" in stages or not os.path.isfile(data):
+        command = [sys.executable, os.path.join(SCRIPT_DIR, "generate_synthetic.py"), str(num_transactions), data, "--seed", str(seed)]
+        wall_time, peak_rss, exit_code = run_measured(command, work_dir)
+        if "generate" in stages:
+            yield Measurement(num_transactions, "generate", wall_time, peak_rss, num_transactions / wall_time, exit_code)
+        if exit_code != 0:
+            return
+
+    for stage in stages:
+        if stage == "generate":
+            continue
+        if stage == "stats_cache_cold":
+            shutil.rmtree(os.path.join(work_dir, "data.json.cache"), ignore_errors=True)
+        wall_time, peak_rss, exit_code = run_measured(_commands(stage, data, work_dir, workers), work_dir)
+        yield Measurement(num_transactions, stage, wall_time, peak_rss, num_transactions / wall_time, exit_code)
+
+
+def format_report(measurements):
+    return format_csv(REPORT_HEADER, REPORT_FORMAT, measurements)
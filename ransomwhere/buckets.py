@@ -0,0 +1,140 @@
+# Bucketing of Unix timestamps (in UTC) into days, ISO weeks, months, quarters and years.
+#
+# run_stats.sh calls `strftime` for every transaction, here the labels ("2021-05", "2021") are formatted once per bucket:
+# - month_index and year_index convert a whole column of timestamps into integer indices (months or years since 1970),
+#   RESOLUTIONS maps every resolution to such a function (and to the label of an index, see the rollup cube in cube.py)
+# - month_label and year_label format the label of an index, bucket_labels formats the labels of the distinct indices only
+# - MonthBuckets finds the month of a single timestamp with a binary search in a table of the starts of the months
+#   (for the engines that walk over the transactions one by one)
+# NumPy is only imported by the vectorized functions, so the streaming engines work without it.
+
+import bisect
+import calendar
+import datetime
+import time
+
+
+FIRST_YEAR = 1970
+SECONDS_PER_DAY = 86400
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday (Monday is 0), ISO weeks start on Monday
+LAST_YEAR = 2200  # The table of MonthBuckets covers 1970-01 until 2200-12, other timestamps fall back to strftime
+
+
+def month_index(times):
+    # Unix timestamps (UTC) -> months since 1970-01 (a vectorized operation on the whole array)
+    import numpy as np
+    return np.asarray(times).astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+
+def year_index(times):
+    # Unix timestamps (UTC) -> years since 1970
+    return month_index(times) // 12
+
+
+def day_index(times):
+    # Unix timestamps (UTC) -> days since 1970-01-01
+    import numpy as np
+    return np.asarray(times, dtype=np.int64) // SECONDS_PER_DAY
+
+
+def week_index(times):
+    # Unix timestamps (UTC) -> ISO weeks since the week of 1970-01-01 (which started on Monday 1969-12-29)
+    return (day_index(times) + EPOCH_WEEKDAY) // 7
+
+
+def quarter_index(times):
+    # Unix timestamps (UTC) -> quarters since 1970-Q1
+    return month_index(times) // 3
+
+
+def day_label(index):
+    # Days since 1970-01-01 -> "%Y-%m-%d"
+    return (datetime.date(FIRST_YEAR, 1, 1) + datetime.timedelta(days=int(index))).isoformat()
+
+
+def week_label(index):
+    # ISO weeks since the week of 1970-01-01 -> "%G-W%V" (the ISO year can differ from the year of the Monday)
+    year, week, _ = week_start(index).isocalendar()
+    return f"{year:04d}-W{week:02d}"
+
+
+def week_start(index):
+    # The Monday of the week
+    return datetime.date(FIRST_YEAR, 1, 1) + datetime.timedelta(days=7 * int(index) - EPOCH_WEEKDAY)
+
+
+def quarter_label(index):
+    # Quarters since 1970-Q1 -> "2021-Q2"
+    year, quarter = divmod(int(index), 4)
+    return f"{FIRST_YEAR + year:04d}-Q{quarter + 1}"
+
+
+def month_label(index):
+    # Months since 1970-01 -> "%Y-%m"
+    year, month = divmod(int(index), 12)
+    return f"{FIRST_YEAR + year:04d}-{month + 1:02d}"
+
+
+def year_label(index):
+    # Years since 1970 -> "%Y"
+    return f"{FIRST_YEAR + int(index):04d}"
+
+
+def bucket_starts(indices, resolution):
+    # The first day of every bucket as datetime64 (e.g. for the x axis of the plots)
+    import numpy as np
+    indices = np.asarray(indices, dtype=np.int64)
+    if resolution == "day":
+        return indices.astype("datetime64[D]")
+    if resolution == "week":
+        return (7 * indices - EPOCH_WEEKDAY).astype("datetime64[D]")
+    if resolution == "month":
+        return indices.astype("datetime64[M]")
+    if resolution == "quarter":
+        return (3 * indices).astype("datetime64[M]")
+    if resolution == "year":
+        return indices.astype("datetime64[Y]")
+    raise ValueError(f"Unknown resolution {resolution}")
+
+
+def bucket_labels(indices, label=month_label):
+    # Returns the distinct indices (sorted), the labels of the distinct indices and the bucket of every element
+    import numpy as np
+    unique_indices, inverse = np.unique(indices, return_inverse=True)
+    return unique_indices, [label(index) for index in unique_indices], inverse
+
+
+# Resolution -> (the indices of a column of timestamps, the label of an index)
+RESOLUTIONS = {
+    "day": (day_index, day_label),
+    "week": (week_index, week_label),
+    "month": (month_index, month_label),
+    "quarter": (quarter_index, quarter_label),
+    "year": (year_index, year_label),
+}
+
+
+class MonthBuckets:
+    # The month ("%Y-%m") of single timestamps without calling strftime for each of them
+
+    def __init__(self, first_year=FIRST_YEAR, last_year=LAST_YEAR):
+        self.starts = [calendar.timegm((year, month, 1, 0, 0, 0)) for year in range(first_year, last_year + 1) for month in range(1, 13)]
+        self.end = calendar.timegm((last_year + 1, 1, 1, 0, 0, 0))
+        first_index = (first_year - FIRST_YEAR) * 12
+        self.labels = [month_label(first_index + i) for i in range(len(self.starts))]
+        # The last month found, the transactions of an address are usually close to each other
+        self.month_start, self.month_end, self.label = self.starts[0], self.starts[0], None
+
+    def __call__(self, timestamp):
+        if self.month_start <= timestamp < self.month_end:
+            return self.label
+        i = bisect.bisect_right(self.starts, timestamp) - 1
+        if i < 0 or timestamp >= self.end:
+            return time.strftime("%Y-%m", time.gmtime(timestamp))
+        self.month_start = self.starts[i]
+        self.month_end = self.starts[i + 1] if i + 1 < len(self.starts) else self.end
+        self.label = self.labels[i]
+        return self.label
+
+
+month_of = MonthBuckets()
@@ -0,0 +1,160 @@
+# Columnar binary cache of the JSON file from the Ransomwhere website.
+#
+# The JSON file is converted once into NumPy arrays (one file per column), which are memory-mapped by later runs:
+# - Transactions: time (int64), amount in Satoshi (int64), amountUSD (float64), family id (int32), address id (int32)
+# - Address records: family id (int32), address id (int32), the number of transactions (int32)
+# - Dictionary tables for the strings: families.json and addresses.json (the id is the index in the list, see strings.py)
+# The transactions are stored in the same order as in the JSON file.
+#
+# The cache is keyed by a hash of the contents of the JSON file, a cache for an older version of the file is rebuilt.
+# The file is only hashed again when its size or modification time differ from the ones stored in the cache.
+
+import json
+import os
+import shutil
+import tempfile
+from array import array
+
+import numpy as np
+
+from ransomwhere.reader import file_hash, file_stat, iter_records
+from ransomwhere.strings import StringTable
+
+
+CACHE_VERSION = 1
+
+TRANSACTION_COLUMNS = {
+    "time": np.int64,
+    "amount": np.int64,
+    "amount_usd": np.float64,
+    "family": np.int32,
+    "address": np.int32,
+}
+RECORD_COLUMNS = {
+    "record_family": np.int32,
+    "record_address": np.int32,
+    "record_transactions": np.int32,
+}
+COLUMNS = {**TRANSACTION_COLUMNS, **RECORD_COLUMNS}
+TYPECODES = {np.int64: "q", np.float64: "d", np.int32: "i"}  # For collecting the values in `array.array`
+
+
+class Columns:
+    # The columns of the dataset (NumPy arrays, possibly memory-mapped) and the dictionary tables
+
+    def __init__(self, arrays, families, addresses):
+        self.arrays = arrays
+        self.families = families
+        self.addresses = addresses
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["arrays"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __len__(self):
+        return len(self.arrays["time"])
+
+
+def build_columns(records):
+    # Expects an iterable of address records (see reader.py), converts them into columns
+    families = StringTable()
+    addresses = StringTable()
+    buffers = {name: array(TYPECODES[dtype]) for name, dtype in COLUMNS.items()}
+
+    for record in records:
+        family = families.encode(record["family"])
+        address = addresses.encode(record["address"])
+        transactions = record["transactions"]
+        buffers["record_family"].append(family)
+        buffers["record_address"].append(address)
+        buffers["record_transactions"].append(len(transactions))
+        for transaction in transactions:
+            buffers["time"].append(transaction["time"])
+            buffers["amount"].append(transaction["amount"])
+            buffers["amount_usd"].append(transaction["amountUSD"])
+            buffers["family"].append(family)
+            buffers["address"].append(address)
+
+    arrays = {name: np.array(buffers[name], dtype=dtype) for name, dtype in COLUMNS.items()}
+    return Columns(arrays, families, addresses)
+
+
+def default_cache_dir(path):
+    # The cache is stored next to the JSON file: data.json -> data.json.cache/
+    return f"{path}.cache"
+
+
+def save_columns(columns, cache_dir, source_hash, source_stat=None):
+    # The cache is written into a temporary directory first, so that an interrupted run never leaves a broken cache
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    tmp_dir = tempfile.mkdtemp(prefix=".ransomwhere-cache-", dir=parent)
+    try:
+        for name, values in columns.arrays.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+        with open(os.path.join(tmp_dir, "families.json"), "w") as file:
+            json.dump(columns.families.strings, file)
+        with open(os.path.join(tmp_dir, "addresses.json"), "w") as file:
+            json.dump(columns.addresses.strings, file)
+        # The metadata is written last, a cache without it is never used
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as file:
+            json.dump({"version": CACHE_VERSION, "source_hash": source_hash, "source_stat": source_stat, "transactions": len(columns)}, file)
+        if os.path.isdir(cache_dir):
+            shutil.rmtree(cache_dir)
+        os.replace(tmp_dir, cache_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def save_meta(cache_dir, meta):
+    # Replaces meta.json of an existing cache (the temporary file is renamed, like the cache itself)
+    tmp_path = os.path.join(cache_dir, ".meta.json")
+    with open(tmp_path, "w") as file:
+        json.dump(meta, file)
+    os.replace(tmp_path, os.path.join(cache_dir, "meta.json"))
+
+
+def read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def load_columns(cache_dir, addresses=True):
+    # The arrays are memory-mapped, nothing is read until the data is used
+    # Without `addresses`, the table of the address strings (the largest part of the cache after the arrays) is not
+    # loaded (columns.addresses is None), e.g. by the workers of parallel.py, which only need the address ids
+    arrays = {name: np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r")
+              for name in COLUMNS}
+    with open(os.path.join(cache_dir, "families.json"), "r") as file:
+        families = StringTable(json.load(file))
+    address_table = None
+    if addresses:
+        with open(os.path.join(cache_dir, "addresses.json"), "r") as file:
+            address_table = StringTable(json.load(file))
+    return Columns(arrays, families, address_table)
+
+
+def update_cache(path, cache_dir):
+    # The cache is (re)built if it does not exist yet or if it has been built for a different version of the file
+    source_stat = file_stat(path)
+    meta = read_meta(cache_dir)
+    if meta is None or meta.get("version") != CACHE_VERSION or meta.get("source_stat") != source_stat:
+        source_hash = file_hash(path)
+        if meta is None or meta.get("version") != CACHE_VERSION or meta.get("source_hash") != source_hash:
+            save_columns(build_columns(iter_records(path)), cache_dir, source_hash, source_stat)
+        else:
+            # The same contents (e.g. downloaded again or touched), the new stat saves hashing the file the next time
+            save_meta(cache_dir, {**meta, "source_stat": source_stat})
+
+
+def open_cache(path, cache_dir=None):
+    # Expects the full JSON file (data.json), returns its columns from the cache
+    if cache_dir is None:
+        cache_dir = default_cache_dir(path)
+    update_cache(path, cache_dir)
+    return load_columns(cache_dir)
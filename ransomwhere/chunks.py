@@ -0,0 +1,46 @@
+# Multi-core parsing of the JSON file: the top-level array is split into ranges of records that are parsed in parallel.
+#
+# The address records are independent, so the file is split into byte ranges at record boundaries (see record_ranges
+# in reader.py, only a small window around every nominal offset is read). Every worker parses its range with the
+# streaming reader and aggregates it into its own StatsEngine, the partial engines are sent back (pickled) and merged
+# in the order of the ranges (see StatsEngine.merge), so families, addresses and months get the same ids as in one pass.
+# There are a few ranges per worker, so that a range with large records does not keep the other workers waiting,
+# and the merging in the main process overlaps with the parsing.
+# Sending back and merging the partial engines costs about a tenth of the parsing (measured on a 220 MB file),
+# so this pays off from two cores on.
+#
+# The statistics are the same as the ones of a single pass (including `approximate_error` and `quantile_compression`),
+# except that the USD sums are added per range first, so their last digit can differ (like in IncrementalStats),
+# and that the quantiles come from merged t-digests, so they differ within the accuracy of the digests (see tdigest.py).
+# Only the standard library is used, like in the streaming engine.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ransomwhere.engine import StatsEngine
+from ransomwhere.reader import compression_opener, iter_range, iter_records, record_ranges
+
+
+RANGES_PER_WORKER = 4
+
+
+def _parse_range(path, start, end, approximate_error, quantile_compression):
+    return StatsEngine(approximate_error, quantile_compression).add_all(iter_range(path, start, end))
+
+
+def compute_stats_parallel(path, workers=None, approximate_error=None, quantile_compression=None):
+    # Expects the full JSON file (data.json), computes all statistics (see compute_stats) with `workers` processes
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or compression_opener(path) is not None:
+        # Nothing to overlap, the pickling and merging of the partial engines would only add time
+        # A compressed file cannot be split into byte ranges, it is decompressed as one stream
+        return StatsEngine(approximate_error, quantile_compression).add_all(iter_records(path))
+    ranges = record_ranges(path, workers * RANGES_PER_WORKER)
+    if not ranges:
+        return StatsEngine(approximate_error, quantile_compression)
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+        futures = [executor.submit(_parse_range, path, start, end, approximate_error, quantile_compression) for start, end in ranges]
+        engine = futures[0].result()
+        for future in futures[1:]:
+            engine.merge(future.result())
+    return engine
@@ -0,0 +1,488 @@
+# The command-line interface of the package: python -m ransomwhere COMMAND [options] (see __main__.py).
+#
+# Every command is a pair of functions: one adds the arguments to an argparse parser, the other runs the command.
+# The scripts in the root of the repository run a single command each (e.g. run_stats.py is the command `stats`).
+#
+# Only argparse and a few constants are imported up front. NumPy, matplotlib and the modules doing the work are imported
+# by the commands that need them (importing matplotlib.pyplot alone takes most of a second), so that `--help` and
+# usage errors return in tens of milliseconds.
+
+import argparse
+import os
+import sys
+
+from ransomwhere.buckets import RESOLUTIONS
+
+
+DATA_HELP = "the current up-to-date version of the dataset (available on: https://api.ransomwhe.re/export), can be compressed with gzip, bzip2 or xz"
+
+# The relative standard error of --approximate-addresses
+DEFAULT_ADDRESS_ERROR = 0.01
+
+# The orders of the families in the heatmap (see order_families in plots.py, not imported here because of matplotlib)
+FAMILY_ORDERS = ("total", "first", "cluster")
+
+
+def _check_data(path):
+    # Check if the provided file exists
+    if not os.path.isfile(path):
+        print(f"File {path} does not exist.", file=sys.stderr)
+        exit(1)
+
+
+# stats (run_stats.py)
+
+def add_stats_arguments(parser):
+    parser.add_argument("data", metavar="data.json", help=DATA_HELP)
+    parser.add_argument("--cache", action="store_true", help="use (and build if needed) the columnar cache of the dataset")
+    parser.add_argument("--cache-dir", help="the directory of the cache (default: data.json.cache)")
+    parser.add_argument("--workers", type=int, metavar="N", help="aggregate the statistics per family with N processes (implies --cache)")
+    parser.add_argument("--state", metavar="FILE", help="update the aggregates in the state file with the new transactions only")
+    parser.add_argument("--quantiles", action="store_true", help="compute the median, p90, p99 and maximum of the ransom sizes (overall, per year, month and family)")
+    parser.add_argument("--database", action="store_true", help="use (and build if needed) the SQLite database of the dataset")
+    parser.add_argument("--database-path", help="the path of the database (default: data.json.sqlite)")
+    parser.add_argument("--approximate-addresses", action="store_true", help="estimate the used and known addresses per family and month with HyperLogLog sketches")
+    parser.add_argument("--address-error", type=float, metavar="ERROR",
+                        help=f"the relative standard error of the estimates (default: {DEFAULT_ADDRESS_ERROR}, implies --approximate-addresses)")
+    parser.add_argument("--parse-workers", type=int, metavar="N", help="parse ranges of the JSON file with N processes and merge their statistics")
+
+
+def run_stats(args):
+    use_cache = args.cache or args.cache_dir is not None or args.workers is not None
+    use_database = args.database or args.database_path is not None
+    approximate = args.approximate_addresses or args.address_error is not None
+    if use_database and (use_cache or args.state is not None or approximate):
+        print("The option --database cannot be used together with --cache, --workers, --state or --approximate-addresses.", file=sys.stderr)
+        exit(1)
+    if args.state is not None and use_cache:
+        print("The option --state cannot be used together with --cache or --workers.", file=sys.stderr)
+        exit(1)
+    if approximate and (args.state is not None or use_cache):
+        print("The option --approximate-addresses cannot be used together with --state, --cache or --workers.", file=sys.stderr)
+        exit(1)
+    if args.quantiles and (args.state is not None or use_cache or use_database):
+        print("The option --quantiles cannot be used together with --state, --cache, --workers or --database.", file=sys.stderr)
+        exit(1)
+    if args.address_error is not None and not 0 < args.address_error < 1:
+        print("The error of --address-error must be between 0 and 1.", file=sys.stderr)
+        exit(1)
+    if args.workers is not None and args.workers < 1:
+        print("The number of workers must be at least 1.", file=sys.stderr)
+        exit(1)
+    if args.parse_workers is not None and (args.state is not None or use_cache or use_database):
+        print("The option --parse-workers cannot be used together with --state, --cache, --workers or --database.", file=sys.stderr)
+        exit(1)
+    if args.parse_workers is not None and args.parse_workers < 1:
+        print("The number of parse workers must be at least 1.", file=sys.stderr)
+        exit(1)
+
+    data = args.data
+    _check_data(data)
+    approximate_error = (args.address_error if args.address_error is not None else DEFAULT_ADDRESS_ERROR) if approximate else None
+
+    from ransomwhere import report
+    from ransomwhere.engine import compute_stats
+    from ransomwhere.reader import iter_records
+    from ransomwhere.tdigest import DEFAULT_COMPRESSION
+
+    report.print_welcome(args.parser.prog)
+
+    if args.state is not None:
+        from ransomwhere.incremental import load_state, save_state
+        engine = load_state(args.state)
+        new_transactions, changed_records, removed_records = engine.update(iter_records(data))
+        save_state(engine, args.state)
+        report.print_misc(f"Folded {new_transactions} new transactions from {changed_records} new or changed address records "
+                          f"and {removed_records} removed address records into {args.state}")
+    elif use_database:
+        from ransomwhere.database import DatabaseStats, open_database
+        engine = DatabaseStats(open_database(data, args.database_path))
+    elif use_cache:
+        # Imported here, since the cache requires NumPy
+        from ransomwhere.cache import default_cache_dir, open_cache
+        from ransomwhere.columnar import ColumnarStats
+        cache_dir = args.cache_dir if args.cache_dir is not None else default_cache_dir(data)
+        columns = open_cache(data, cache_dir)
+        if args.workers is not None and args.workers > 1:
+            from ransomwhere.parallel import ShardedStats
+            engine = ShardedStats(columns, cache_dir, args.workers)
+        else:
+            engine = ColumnarStats(columns)
+    elif args.parse_workers is not None:
+        from ransomwhere.chunks import compute_stats_parallel
+        engine = compute_stats_parallel(data, args.parse_workers, approximate_error, DEFAULT_COMPRESSION if args.quantiles else None)
+    else:
+        engine = compute_stats(iter_records(data), approximate_error, DEFAULT_COMPRESSION if args.quantiles else None)
+
+    # Print general statistics: total number of addresses, total number of transactions, total payment sum (BTC and USD) etc.
+    report.print_general_stats(engine)
+
+    # Print the payment timeline per year
+    timeline_years = report.timeline_years_csv(engine)
+    report.print_timeline_years(timeline_years)
+    with open("timeline_years.csv", "w") as file:
+        file.write(timeline_years)
+
+    # Print the payment timeline per month
+    timeline_months = report.timeline_months_csv(engine)
+    report.print_timeline_months(timeline_months)
+    with open("timeline_months.csv", "w") as file:
+        file.write(timeline_months)
+
+    # Print the timeline of ransomware families per month (use `totals=True` to keep the "Total" rows)
+    timeline_families = report.timeline_families_csv(engine, totals=False)
+    report.print_timeline_families(timeline_families)
+    with open("timeline_families.csv", "w") as file:
+        file.write(timeline_families)
+
+    if args.quantiles:
+        # Print the quantiles of the ransom sizes and save them per year, month and family
+        report.print_quantiles(engine)
+        quantiles_years = report.quantiles_years_csv(engine)
+        report.print_quantiles_years(quantiles_years)
+        for name, text in (("quantiles_years.csv", quantiles_years), ("quantiles_months.csv", report.quantiles_months_csv(engine)),
+                           ("quantiles_families.csv", report.quantiles_families_csv(engine))):
+            with open(name, "w") as file:
+                file.write(text)
+
+    report.print_goodbye()
+
+
+# top-families (compute_top_families.py)
+
+def add_top_families_arguments(parser):
+    from ransomwhere.topk import METRICS
+    parser.add_argument("data", metavar="data.json", help=DATA_HELP)
+    parser.add_argument("--top", type=int, default=15, metavar="N", help="the number of families per metric (default: 15)")
+    parser.add_argument("--metrics", nargs="+", choices=list(METRICS), default=list(METRICS), help="the metrics (default: count btc usd)")
+    parser.add_argument("--csv", metavar="FILE", help="save the top families into a csv file (with the metric and the rank in the first columns)")
+    parser.add_argument("--json", metavar="FILE", help="save the top families into a JSON file")
+    parser.add_argument("--cache", action="store_true", help="use (and build if needed) the columnar cache of the dataset")
+    parser.add_argument("--cache-dir", help="the directory of the cache (default: data.json.cache)")
+    parser.add_argument("--workers", type=int, metavar="N", help="aggregate the totals per family with N processes (implies --cache)")
+
+
+def run_top_families(args):
+    if args.top < 1:
+        print("The number of families must be at least 1.", file=sys.stderr)
+        exit(1)
+    if args.workers is not None and args.workers < 1:
+        print("The number of workers must be at least 1.", file=sys.stderr)
+        exit(1)
+    _check_data(args.data)
+
+    import json
+    from ransomwhere import report
+    from ransomwhere.reader import iter_records
+    from ransomwhere.topk import METRICS, TOP_FAMILIES_FORMAT, TOP_FAMILIES_HEADER, family_totals, top_k
+
+    if args.cache or args.cache_dir is not None or args.workers is not None:
+        # Imported here, since the cache requires NumPy
+        from ransomwhere.cache import default_cache_dir, open_cache
+        from ransomwhere.columnar import ColumnarStats
+        cache_dir = args.cache_dir if args.cache_dir is not None else default_cache_dir(args.data)
+        columns = open_cache(args.data, cache_dir)
+        if args.workers is not None and args.workers > 1:
+            from ransomwhere.parallel import ShardedStats
+            rows = ShardedStats(columns, cache_dir, args.workers).top_families_stats()
+        else:
+            rows = ColumnarStats(columns).top_families_stats()
+    else:
+        rows = family_totals(iter_records(args.data))
+    top = top_k(rows, args.top, args.metrics)
+
+    for i, metric in enumerate(args.metrics):
+        prefix = "\n" if i > 0 else ""
+        report.print_title(f"{prefix}Top {args.top} families by {METRICS[metric][1]}")
+        report.print_result(report.format_table(report.format_csv(TOP_FAMILIES_HEADER, TOP_FAMILIES_FORMAT, top[metric])))
+
+    if args.csv is not None:
+        rows = [(metric, rank, *row) for metric in args.metrics for rank, row in enumerate(top[metric], 1)]
+        with open(args.csv, "w") as file:
+            file.write(report.format_csv(f"Metric,Rank,{TOP_FAMILIES_HEADER}", f"%s,%d,{TOP_FAMILIES_FORMAT}", rows))
+
+    if args.json is not None:
+        result = {
+            metric: [{"family": family, "count": count, "sum_btc": sum_btc, "sum_usd": sum_usd} for family, count, sum_btc, sum_usd in top[metric]]
+            for metric in args.metrics
+        }
+        with open(args.json, "w") as file:
+            json.dump(result, file, indent=2)
+            file.write("\n")
+
+
+# query-families (query_families.py)
+
+def add_query_families_arguments(parser):
+    parser.add_argument("data", metavar="data.json", help=DATA_HELP)
+    parser.add_argument("families", metavar="family", nargs="*", help="the ransomware families of interest (e.g. Locky Conti WannaCry)")
+    parser.add_argument("--all", action="store_true", help="query all families in the dataset")
+    parser.add_argument("--cache-dir", help="the directory of the cache and the index (default: data.json.cache)")
+
+
+def run_query_families(args):
+    if not args.families and not args.all:
+        print("Provide the families of interest or use --all.", file=sys.stderr)
+        exit(1)
+    _check_data(args.data)
+
+    from ransomwhere import report
+    from ransomwhere.engine import collation_key
+    from ransomwhere.family_index import open_index
+
+    index = open_index(args.data, args.cache_dir)
+    families = sorted(index.families.strings, key=collation_key) if args.all else args.families
+    for family in families:
+        addresses, transactions = index.query(family)
+        report.print_title(f"{family}:")
+        report.print_misc(f"Unique addresses: {addresses}\nNumber of transactions: {transactions}")
+
+
+# export-database (export_database.py)
+
+def add_export_database_arguments(parser):
+    parser.add_argument("data", metavar="data.json", help=DATA_HELP)
+    parser.add_argument("database", nargs="?", help="the path of the database (default: data.json.sqlite)")
+
+
+def run_export_database(args):
+    _check_data(args.data)
+
+    from ransomwhere import report
+    from ransomwhere.database import default_database_path, update_database
+
+    database = args.database if args.database is not None else default_database_path(args.data)
+    update_database(args.data, database)
+    report.print_misc(f"The database is up to date: {database}")
+
+
+# plot-months, plot-families and plot-top-families (plot_months.py, plot_families.py and plot_top_families.py)
+
+def _add_timeline_arguments(parser, csv_name, csv_help):
+    parser.add_argument("csv", metavar=csv_name, nargs="?", help=csv_help)
+    parser.add_argument("--data", metavar="data.json", help="read the timeline from the rollup cube of the dataset instead of the csv file")
+    parser.add_argument("--resolution", choices=RESOLUTIONS, default="month", help="the resolution of the timeline with --data (default: month)")
+    parser.add_argument("--cache-dir", help="the directory of the cache (default: data.json.cache)")
+
+
+def _check_timeline_arguments(args, csv_name):
+    if (args.csv is None) == (args.data is None):
+        args.parser.error(f"provide either {csv_name} or --data data.json")
+
+
+def add_plot_months_arguments(parser):
+    _add_timeline_arguments(parser, "timeline_months.csv", "the timeline of transactions per month")
+    parser.add_argument("--scale", choices=("linear", "log"), default="linear", help="the scale of the y axes (default: linear)")
+
+
+def run_plot_months(args):
+    _check_timeline_arguments(args, "timeline_months.csv")
+
+    import matplotlib.pyplot as plt
+    from ransomwhere.plots import plot_months
+
+    usd_factor = 1000000  # Show USD timeline in million USD
+
+    if args.data is not None:
+        # Imported here, the cube is only built when it is used
+        from ransomwhere.cube import CubeMonthTimeline, open_cube
+        timeline = CubeMonthTimeline(open_cube(args.data, args.cache_dir), args.resolution)
+    else:
+        from ransomwhere.loader import MonthTimeline
+        timeline = MonthTimeline(args.csv)
+    fig = plot_months(timeline, scale=args.scale, usd_factor=usd_factor, resolution=args.resolution)
+
+    # plt.savefig("timeline_months.png")
+    plt.show()
+
+
+def _family_timeline(args, exclude=()):
+    # The series of a family are views into the columns, e.g. timeline.series("Conti", "sum_usd")
+    if args.data is not None:
+        # Imported here, the cube is only built when it is used
+        from ransomwhere.cube import CubeFamilyTimeline, open_cube
+        return CubeFamilyTimeline(open_cube(args.data, args.cache_dir), args.resolution, exclude=exclude)
+    from ransomwhere.loader import FamilyTimeline
+    return FamilyTimeline(args.csv, exclude=exclude)
+
+
+def add_plot_families_arguments(parser):
+    _add_timeline_arguments(parser, "timeline_families.csv", "the timeline of ransomware families per month")
+    parser.add_argument("--heatmap", action="store_true", help="plot all families in one heatmap instead of three groups of timelines")
+    parser.add_argument("--order", choices=FAMILY_ORDERS, default="total", help="the order of the families in the heatmap (default: total)")
+
+
+def run_plot_families(args):
+    _check_timeline_arguments(args, "timeline_families.csv")
+
+    import matplotlib.pyplot as plt
+    from ransomwhere.plots import MEDIUM_THRESHOLD, SMALL_THRESHOLD, family_colours, plot_family_group, plot_family_heatmap, split_family_groups
+
+    timeline = _family_timeline(args)
+
+    if args.heatmap:
+        fig = plot_family_heatmap(timeline, order=args.order)
+        #plt.savefig("timeline_families_heatmap.png")
+        plt.show()
+        return
+
+    colours = family_colours(timeline)
+
+    # Splitting into groups based on the largest monthly payment sum in USD
+    groups = split_family_groups(timeline)
+    print(f"Small (< {SMALL_THRESHOLD} USD):", len(groups["small"]))
+    print(f"Medium (< {MEDIUM_THRESHOLD} USD):", len(groups["medium"]))
+    print(f"Large (>= {MEDIUM_THRESHOLD} USD):", len(groups["large"]))
+
+    for group_name, family_names in groups.items():
+        fig = plot_family_group(timeline, family_names, group_name, colours)
+        #plt.savefig(f"timeline_families_{group_name}.png")
+        plt.show()
+        fig.clf()
+
+
+def add_plot_top_families_arguments(parser):
+    _add_timeline_arguments(parser, "timeline_families.csv", "the timeline of ransomware families per month")
+    parser.add_argument("--top", type=int, default=15, metavar="N", help="the number of families per metric (default: 15)")
+    parser.add_argument("--scale", choices=("linear", "log"), default="linear", help="the scale of the y axes (default: linear)")
+
+
+def run_plot_top_families(args):
+    _check_timeline_arguments(args, "timeline_families.csv")
+    if args.top < 1:
+        args.parser.error("the number of families must be at least 1")
+
+    import matplotlib.pyplot as plt
+    from ransomwhere.plots import plot_top_families
+
+    usd_factor = 1  # Use 1000000 to convert to millions
+
+    timeline = _family_timeline(args, exclude=["BlackCat"])
+    timeline.sum_usd /= usd_factor
+    fig = plot_top_families(timeline, topN=args.top, scale=args.scale)
+
+    #plt.savefig("timeline_top_families.png")
+    plt.show()
+
+
+# render-plots (render_plots.py)
+
+def add_render_plots_arguments(parser):
+    from ransomwhere.render import FIGURES
+    parser.add_argument("months_csv", metavar="timeline_months.csv", help="the timeline of transactions per month")
+    parser.add_argument("families_csv", metavar="timeline_families.csv", help="the timeline of ransomware families per month")
+    parser.add_argument("-o", "--output", default=".", help="the output directory (default: the current directory)")
+    parser.add_argument("--workers", type=int, help="the number of processes (default: one per figure, at most the number of CPUs)")
+    parser.add_argument("--figures", nargs="+", choices=FIGURES, default=FIGURES, help="the figures to render (default: all)")
+    parser.add_argument("--dpi", type=int, default=100, help="the resolution of the png files (default: 100)")
+    parser.add_argument("--cache-dir", help="the directory of the render cache (default: OUTPUT/.render_cache)")
+    parser.add_argument("--no-cache", action="store_true", help="render all figures, without reading or writing the render cache")
+
+
+def run_render_plots(args):
+    import time
+    from ransomwhere.render import render_all
+
+    start = time.perf_counter()
+    figures = render_all(args.months_csv, args.families_csv, args.output, args.figures, args.workers, args.dpi,
+                         cache_dir=args.cache_dir, use_cache=not args.no_cache)
+    for name, path, elapsed, cached in figures:
+        print(f"{name}: {path} ({elapsed:.2f} s{', cached' if cached else ''})")
+    print(f"Total: {time.perf_counter() - start:.2f} s")
+
+
+# generate (generate_synthetic.py)
+
+def add_generate_arguments(parser):
+    parser.add_argument("transactions", type=int, help="the number of transactions (e.g. 10000 up to 100000000)")
+    parser.add_argument("output", metavar="data.json", help="the output file")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the random generator (default: 0)")
+    parser.add_argument("--families", type=int, help="the number of families (default: grows slowly with the number of transactions)")
+
+
+def run_generate(args):
+    import time
+    from ransomwhere.synthetic import write_export
+
+    start = time.perf_counter()
+    num_records = write_export(args.output, args.transactions, args.seed, args.families)
+    print(f"{args.output}: {args.transactions} transactions, {num_records} addresses ({time.perf_counter() - start:.2f} s)")
+
+
+# benchmark (benchmark.py)
+
+def add_benchmark_arguments(parser):
+    from ransomwhere.benchmark import SHELL_STAGES, STAGES
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000], help="the numbers of transactions (default: 10^4 10^5 10^6)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES + SHELL_STAGES, default=STAGES, help="the stages to run (default: all except the shell scripts)")
+    parser.add_argument("--workers", type=int, default=4, help="the number of processes of the stage stats_workers (default: 4)")
+    parser.add_argument("--seed", type=int, default=0, help="the seed of the synthetic exports (default: 0)")
+    parser.add_argument("--work-dir", help="keep the exports and the outputs in this directory (default: a temporary directory)")
+    parser.add_argument("--report", help="save the measurements into this csv file")
+
+
+def run_benchmark(args):
+    import shutil
+    import tempfile
+    from ransomwhere import report
+    from ransomwhere.benchmark import benchmark_size, format_report
+
+    work_dir = args.work_dir if args.work_dir is not None else tempfile.mkdtemp(prefix="ransomwhere-benchmark-")
+
+    measurements = []
+    try:
+        for size in args.sizes:
+            for measurement in benchmark_size(size, os.path.join(work_dir, str(size)), args.stages, args.workers, args.seed):
+                status = "" if measurement.exit_code == 0 else f" (failed with exit code {measurement.exit_code})"
+                print(f"{size} {measurement.stage}: {measurement.wall_time:.2f} s, {measurement.peak_rss:.1f} MiB{status}", flush=True)
+                measurements.append(measurement)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    csv_text = format_report(measurements)
+    report.print_title("Benchmark results")
+    report.print_result(report.format_table(csv_text))
+    if args.report is not None:
+        with open(args.report, "w") as file:
+            file.write(csv_text)
+
+
+# name: (add the arguments, run, description, epilog)
+COMMANDS = {
+    "stats": (add_stats_arguments, run_stats, "Compute statistics on the Ransomwhere dataset.", None),
+    "top-families": (add_top_families_arguments, run_top_families, "Compute the top N ransomware families in the Ransomwhere dataset.", None),
+    "query-families": (add_query_families_arguments, run_query_families, "Print the number of addresses and transactions of ransomware families.", None),
+    "export-database": (add_export_database_arguments, run_export_database, "Load the Ransomwhere dataset into a SQLite database.", None),
+    "plot-months": (add_plot_months_arguments, run_plot_months, "Plot the timeline of ransom transactions.", "Run run_stats.sh to get timeline_months.csv file"),
+    "plot-families": (add_plot_families_arguments, run_plot_families, "Plot the timeline of all ransomware families.", "Run run_stats.sh to get timeline_families.csv file"),
+    "plot-top-families": (add_plot_top_families_arguments, run_plot_top_families, "Plot the timeline of the top ransomware families.", "Run run_stats.sh to get timeline_families.csv file"),
+    "render-plots": (add_render_plots_arguments, run_render_plots, "Render all plots into png files.", None),
+    "generate": (add_generate_arguments, run_generate, "Write a synthetic export of the Ransomwhere dataset.", None),
+    "benchmark": (add_benchmark_arguments, run_benchmark, "Benchmark the scripts on synthetic exports of the Ransomwhere dataset.", None),
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m ransomwhere", description="Statistics and plots of the Ransomwhere dataset.")
+    subparsers = parser.add_subparsers(dest="command", metavar="command", required=True)
+    for name, (add_arguments, run, description, epilog) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=description, description=description, epilog=epilog)
+        add_arguments(subparser)
+        subparser.set_defaults(run=run, parser=subparser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.run(args)
+
+
+def run_command(name, argv=None):
+    # Runs one command with its own parser (the scripts in the root of the repository, e.g. run_stats.py)
+    add_arguments, run, description, epilog = COMMANDS[name]
+    parser = argparse.ArgumentParser(description=description, epilog=epilog)
+    add_arguments(parser)
+    parser.set_defaults(parser=parser)
+    args = parser.parse_args(argv)
+    run(args)
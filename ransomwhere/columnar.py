@@ -0,0 +1,199 @@
+# Vectorized statistics on the columns of the dataset (see cache.py).
+#
+# ColumnarStats computes the same statistics as StatsEngine (engine.py), but with NumPy operations on whole columns.
+# The sums are accumulated with `np.bincount`, which adds the values in the order of the array (like awk),
+# so the results are identical to the ones from StatsEngine. The BTC sums are exact sums in Satoshi (see satoshi_sums).
+
+import math
+
+import numpy as np
+
+from ransomwhere import BITCOIN_FACTOR
+from ransomwhere.buckets import bucket_labels, month_index, month_label, year_label
+from ransomwhere.engine import GeneralStats, collation_key
+
+
+def sequential_sum(values):
+    # Sum in the order of the array (`np.sum` uses pairwise summation, which can differ in the last digits)
+    if len(values) == 0:
+        return 0.0
+    return float(np.bincount(np.zeros(len(values), dtype=np.intp), weights=values)[0])
+
+
+def satoshi_sums(group, amounts, minlength=0):
+    # Exact sums of the amounts in Satoshi per group (int64)
+    # The float64 sums of `np.bincount` are exact for integers below 2^53 Satoshi (~90 million BTC, more than all bitcoins),
+    # larger totals are summed in int64
+    if int(np.abs(amounts).sum()) < 2 ** 53:
+        return np.bincount(group, weights=amounts, minlength=minlength).astype(np.int64)
+    sums = np.zeros(max(minlength, int(group.max()) + 1 if len(group) > 0 else 0), dtype=np.int64)
+    np.add.at(sums, group, amounts)
+    return sums
+
+
+def hash_index(keys):
+    # Hash set of non-negative int64 keys without sorting them (open addressing, linear probing, load factor < 1/4)
+    # Every round writes the pending keys to the empty slots they hash to, the keys that find another key in their
+    # slot probe the next one. Returns the table (-1 is an empty slot) and the slot of every key
+    size = 1 << (4 * len(keys)).bit_length()
+    table = np.full(size, -1, dtype=np.int64)
+    shift = np.uint64(65 - size.bit_length())
+    slot = ((keys.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)) >> shift).astype(np.int64)  # Fibonacci hashing
+    index = np.empty(len(keys), dtype=np.int64)
+    rows = np.arange(len(keys))
+    while len(rows) > 0:
+        pending = keys[rows]
+        empty = table[slot] == -1
+        table[slot[empty]] = pending[empty]
+        placed = table[slot] == pending
+        index[rows[placed]] = slot[placed]
+        rows, slot = rows[~placed], (slot[~placed] + 1) & (size - 1)
+    return table, index
+
+
+def address_counts(group, num_groups, bucket, num_buckets, address):
+    # Used addresses (distinct addresses per (group, bucket)) and known addresses (cumulative over the buckets)
+    # as arrays of the shape (num_groups, num_buckets). The (group, bucket, address) and (group, address) pairs
+    # are deduplicated in hash sets, so nothing of the size of the transactions is sorted
+    num_cells = num_groups * num_buckets
+    num_addresses = int(address.max()) + 1 if len(address) > 0 else 1
+    address = address.astype(np.int64)
+
+    cells, _ = hash_index((group * num_buckets + bucket) * num_addresses + address)
+    used = np.bincount(cells[cells >= 0] // num_addresses, minlength=num_cells)
+
+    # The first bucket of every (group, address) pair
+    pairs, pair_index = hash_index(group * num_addresses + address)
+    pair_first_bucket = np.full(len(pairs), num_buckets, dtype=np.int64)
+    np.minimum.at(pair_first_bucket, pair_index, bucket)
+    seen = pairs >= 0
+    new = np.bincount((pairs[seen] // num_addresses) * num_buckets + pair_first_bucket[seen], minlength=num_cells)
+    known = np.cumsum(new.reshape(num_groups, num_buckets), axis=1)
+    return used.reshape(num_groups, num_buckets), known
+
+
+class ColumnarStats:
+
+    def __init__(self, columns, rows=None):
+        # If `rows` (the indices of transactions, in the order of the file) is given, only these transactions are used
+        # (the transactions of a shard of families for the timeline of families and the family totals, see parallel.py)
+        self.columns = columns
+        self.time = np.asarray(columns.time)
+        self.amount = np.asarray(columns.amount)
+        self.usd = np.asarray(columns.amount_usd)
+        self.family = np.asarray(columns.family)
+        self.address = np.asarray(columns.address)
+        if rows is not None:
+            self.time = self.time[rows]
+            self.amount = self.amount[rows]
+            self.usd = self.usd[rows]
+            self.family = self.family[rows]
+            self.address = self.address[rows]
+        self.months = month_index(self.time)
+
+    def general_stats(self):
+        columns = self.columns
+        num_transactions = len(self.time)
+        record_family = np.asarray(columns.record_family)
+        record_address = np.asarray(columns.record_address)
+        empty = np.asarray(columns.record_transactions) == 0
+
+        families = np.unique(record_family)
+        non_empty_families = np.unique(record_family[~empty])
+        empty_families = np.setdiff1d(np.unique(record_family[empty]), non_empty_families)
+        empty_counts = np.bincount(record_family[empty], minlength=len(columns.families))
+
+        times = self.time
+        total_btc = int(self.amount.sum()) / BITCOIN_FACTOR
+        return GeneralStats(
+            num_transactions=num_transactions,
+            total_btc=total_btc,
+            total_usd=math.fsum(self.usd),
+            mean_btc=total_btc / num_transactions if num_transactions > 0 else None,
+            mean_usd=sequential_sum(self.usd) / num_transactions if num_transactions > 0 else None,
+            first_time=int(times.min()) if num_transactions > 0 else None,
+            last_time=int(times.max()) if num_transactions > 0 else None,
+            num_families=len(families),
+            num_non_empty_families=len(non_empty_families),
+            num_empty_families=len(empty_families),
+            num_addresses=len(np.unique(record_address)),
+            num_empty_addresses=len(np.unique(record_address[empty])),
+            empty_address_counts={columns.families[i]: int(count) for i, count in enumerate(empty_counts) if count > 0},
+        )
+
+    def timeline_years(self):
+        # Rows: (year, count, sum_btc, sum_usd, avg_btc, avg_usd), sorted by year
+        years = self.months // 12
+        return _timeline_rows(years, self.amount, self.usd, year_label)
+
+    def timeline_months(self):
+        # Rows: (month, count, sum_btc, sum_usd, avg_btc, avg_usd), sorted by month
+        return _timeline_rows(self.months, self.amount, self.usd, month_label)
+
+    def top_families_stats(self):
+        # Rows: (family, count, sum_btc, sum_usd), the same as `compute_stats` in compute_top_families.sh
+        family = self.family
+        counts = np.bincount(family, minlength=len(self.columns.families))
+        sum_satoshi = satoshi_sums(family, self.amount, len(counts))
+        sum_usd = np.bincount(family, weights=self.usd, minlength=len(counts))
+        return [(self.columns.families[i], int(counts[i]), int(sum_satoshi[i]) / BITCOIN_FACTOR, float(sum_usd[i]))
+                for i in range(len(counts)) if counts[i] > 0]
+
+    def timeline_families(self, totals=True):
+        # Rows: (family, month, count, sum_btc, sum_usd, used_addresses, known_addresses), sorted by family and month
+        # After the months of each family there is a row with month "Total" (if `totals` is set)
+        columns = self.columns
+        if len(self.time) == 0:
+            return []
+
+        # Only the family names are sorted, the (family, month) groups are cells of a dense family x month grid
+        names = columns.families.strings
+        order = sorted(range(len(names)), key=lambda i: collation_key(names[i]))
+        names_by_rank = [names[i] for i in order]
+        num_families = len(names)
+        family_rank = np.empty(num_families, dtype=np.int64)
+        family_rank[order] = np.arange(num_families)
+
+        family = family_rank[self.family]
+        first_month = int(self.months.min())
+        num_months = int(self.months.max()) - first_month + 1
+        cell = family * num_months + (self.months - first_month)
+        num_cells = num_families * num_months
+
+        counts = np.bincount(cell, minlength=num_cells)
+        sum_satoshi = satoshi_sums(cell, self.amount, num_cells)
+        sum_usd = np.bincount(cell, weights=self.usd, minlength=num_cells)
+
+        used, known = address_counts(family, num_families, self.months - first_month, num_months, self.address)
+        used, known = used.ravel(), known.ravel()
+
+        total_counts = np.bincount(family, minlength=num_families)
+        total_satoshi = satoshi_sums(family, self.amount, num_families)
+        total_usd = np.bincount(family, weights=self.usd, minlength=num_families)
+
+        labels = [month_label(first_month + month) for month in range(num_months)]
+        rows = []
+        cells = np.flatnonzero(counts)  # In the order of the families and months
+        for j, i in enumerate(cells):
+            rank, month = divmod(int(i), num_months)
+            name = names_by_rank[rank]
+            rows.append((name, labels[month], int(counts[i]), int(sum_satoshi[i]) / BITCOIN_FACTOR, float(sum_usd[i]), int(used[i]), int(known[i])))
+            if totals and (j == len(cells) - 1 or cells[j + 1] // num_months != rank):
+                # Here total used addresses and total known addresses are the same (we know all addresses they have used)
+                rows.append((name, "Total", int(total_counts[rank]), int(total_satoshi[rank]) / BITCOIN_FACTOR, float(total_usd[rank]), int(known[i]), int(known[i])))
+        return rows
+
+
+def _timeline_rows(keys, amounts, usd, label):
+    if len(keys) == 0:
+        return []
+    _, labels, group = bucket_labels(keys, label)
+    counts = np.bincount(group)
+    sum_satoshi = satoshi_sums(group, amounts)
+    sum_usd = np.bincount(group, weights=usd)
+    rows = []
+    for i, key_label in enumerate(labels):
+        count = int(counts[i])
+        sum_btc = int(sum_satoshi[i]) / BITCOIN_FACTOR
+        rows.append((key_label, count, sum_btc, float(sum_usd[i]), sum_btc / count, float(sum_usd[i]) / count))
+    return rows
@@ -0,0 +1,197 @@
+# Multi-resolution rollup cube of the transactions: time bucket x family, stored in the columnar cache (see cache.py).
+#
+# run_stats.sh only computes timelines per year and per month (and per family and month), each with its own pass.
+# The cube holds dense 2-D arrays for every resolution (day, ISO week, month, quarter and year, see buckets.py) and metric:
+# - Row i is the family with id i (the order of families.json), the last row is the total over all families
+# - Column j is the bucket `first + j`, where `first` is the first bucket with transactions (empty buckets are zeros)
+# - Metrics: count, sum_satoshi (exact), sum_btc, sum_usd, used_addresses and known_addresses (cumulative, as in the
+#   timeline of families of run_stats.sh)
+# The arrays are saved as .npy files next to the columns and memory-mapped, so the series of a family (or a range
+# of buckets) at any resolution is a view into the cube, e.g. cube.series("week", "sum_usd", "LockBit").
+# The month of every transaction is computed once, the quarters and years are derived from it.
+# The total row at the month resolution is the same as timeline_months.csv, the family rows are timeline_families.csv
+# (plus the empty months).
+#
+# CubeMonthTimeline and CubeFamilyTimeline present one resolution of the cube like the csv files (see loader.py),
+# so that the plots (see plots.py) can be drawn at any resolution.
+
+import json
+import os
+
+import numpy as np
+
+from ransomwhere import BITCOIN_FACTOR
+from ransomwhere.buckets import RESOLUTIONS, bucket_starts, day_index, month_index, week_index
+from ransomwhere.cache import default_cache_dir, load_columns, update_cache
+from ransomwhere.columnar import address_counts, satoshi_sums
+from ransomwhere.engine import collation_key
+from ransomwhere.loader import FamilyTimeline, MonthTimeline
+from ransomwhere.strings import StringTable
+
+
+CUBE_VERSION = 1
+CUBE_METRICS = ("count", "sum_satoshi", "sum_btc", "sum_usd", "used_addresses", "known_addresses")
+
+
+def _bucket_indices(times):
+    # The indices of the buckets of every resolution (the months are computed only once)
+    months = month_index(times)
+    return {
+        "day": day_index(times),
+        "week": week_index(times),
+        "month": months,
+        "quarter": months // 3,
+        "year": months // 12,
+    }
+
+
+def _grid(row, num_rows, bucket, num_buckets, address, amount, usd):
+    # The metrics of the cells (row, bucket) as arrays of the shape (num_rows, num_buckets)
+    num_cells = num_rows * num_buckets
+    cell = row * num_buckets + bucket
+    count = np.bincount(cell, minlength=num_cells)
+    sum_satoshi = satoshi_sums(cell, amount, num_cells)
+    sum_usd = np.bincount(cell, weights=usd, minlength=num_cells)
+
+    used, known = address_counts(row, num_rows, bucket, num_buckets, address)
+
+    shape = (num_rows, num_buckets)
+    return {
+        "count": count.reshape(shape),
+        "sum_satoshi": sum_satoshi.reshape(shape),
+        "sum_btc": sum_satoshi.reshape(shape) / BITCOIN_FACTOR,
+        "sum_usd": sum_usd.reshape(shape),
+        "used_addresses": used,
+        "known_addresses": known,
+    }
+
+
+def build_cube(columns):
+    # Returns the arrays of the cube ({(resolution, metric): array}) and the first bucket of every resolution
+    times = np.asarray(columns.time)
+    family = np.asarray(columns.family, dtype=np.int64)
+    address = np.asarray(columns.address, dtype=np.int64)
+    amount = np.asarray(columns.amount)
+    usd = np.asarray(columns.amount_usd)
+    num_families = len(columns.families)
+
+    arrays = dict()
+    first = dict()
+    for resolution, indices in _bucket_indices(times).items():
+        first[resolution] = int(indices.min()) if len(indices) > 0 else 0
+        num_buckets = int(indices.max()) - first[resolution] + 1 if len(indices) > 0 else 0
+        bucket = indices - first[resolution]
+        families = _grid(family, num_families, bucket, num_buckets, address, amount, usd)
+        total = _grid(np.zeros_like(family), 1, bucket, num_buckets, address, amount, usd)
+        for metric in CUBE_METRICS:
+            arrays[(resolution, metric)] = np.concatenate((families[metric], total[metric]))
+    return arrays, first
+
+
+def save_cube(arrays, first, cache_dir):
+    # The arrays are written first and cube.json last, a cube without it is rebuilt
+    for (resolution, metric), values in arrays.items():
+        tmp_path = os.path.join(cache_dir, f".cube_{resolution}_{metric}.npy")
+        np.save(tmp_path, values)
+        os.replace(tmp_path, os.path.join(cache_dir, f"cube_{resolution}_{metric}.npy"))
+    with open(os.path.join(cache_dir, "cube.json"), "w") as file:
+        json.dump({"version": CUBE_VERSION, "first": first}, file)
+
+
+def _read_cube_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "cube.json"), "r") as file:
+            meta = json.load(file)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == CUBE_VERSION else None
+
+
+class RollupCube:
+
+    def __init__(self, arrays, first, families):
+        self.arrays = arrays
+        self.first = first
+        self.families = families  # StringTable, the family of row i
+
+    def _row(self, family):
+        # None is the total over all families
+        if family is None:
+            return len(self.families)
+        i = self.families.get(family)
+        if i is None:
+            raise KeyError(family)
+        return i
+
+    def num_buckets(self, resolution):
+        return self.arrays[(resolution, "count")].shape[1]
+
+    def bucket_indices(self, resolution):
+        return np.arange(self.first[resolution], self.first[resolution] + self.num_buckets(resolution))
+
+    def starts(self, resolution):
+        # The first day of every bucket (datetime64)
+        return bucket_starts(self.bucket_indices(resolution), resolution)
+
+    def labels(self, resolution):
+        # The labels of the buckets ("2021-05-31", "2021-W22", "2021-05", "2021-Q2", "2021")
+        _, label = RESOLUTIONS[resolution]
+        return [label(index) for index in self.bucket_indices(resolution)]
+
+    def table(self, resolution, metric):
+        # The whole 2-D array (families and the total x buckets)
+        return self.arrays[(resolution, metric)]
+
+    def series(self, resolution, metric, family=None, start=None, stop=None):
+        # A view of the metric of the family (or of the total) in the buckets start:stop (positions in `starts`)
+        return self.arrays[(resolution, metric)][self._row(family), start:stop]
+
+
+def load_cube(cache_dir):
+    meta = _read_cube_meta(cache_dir)
+    arrays = {(resolution, metric): np.load(os.path.join(cache_dir, f"cube_{resolution}_{metric}.npy"), mmap_mode="r")
+              for resolution in RESOLUTIONS for metric in CUBE_METRICS}
+    with open(os.path.join(cache_dir, "families.json"), "r") as file:
+        families = StringTable(json.load(file))
+    return RollupCube(arrays, meta["first"], families)
+
+
+def open_cube(path, cache_dir=None):
+    # Expects the full JSON file (data.json), returns the cube from the cache (the cache and the cube are built if needed)
+    if cache_dir is None:
+        cache_dir = default_cache_dir(path)
+    update_cache(path, cache_dir)
+    if _read_cube_meta(cache_dir) is None:
+        arrays, first = build_cube(load_columns(cache_dir))
+        save_cube(arrays, first, cache_dir)
+    return load_cube(cache_dir)
+
+
+class CubeMonthTimeline(MonthTimeline):
+    # The total over all families at one resolution, only the buckets with transactions (like timeline_months.csv)
+
+    def __init__(self, cube, resolution):
+        count = cube.series(resolution, "count")
+        buckets = np.flatnonzero(count)
+        count = count[buckets]
+        sum_btc = cube.series(resolution, "sum_btc")[buckets]
+        sum_usd = cube.series(resolution, "sum_usd")[buckets]
+        self._set_columns(cube.starts(resolution)[buckets], count, sum_btc, sum_usd, sum_btc / count, sum_usd / count)
+
+
+class CubeFamilyTimeline(FamilyTimeline):
+    # The families at one resolution, only the buckets with transactions (like timeline_families.csv without the totals)
+    # The families are sorted like in the csv file
+
+    def __init__(self, cube, resolution, exclude=()):
+        count = cube.table(resolution, "count")[:len(cube.families)]
+        names = cube.families.strings
+        families = sorted((i for i in range(len(names)) if count[i].any() and names[i] not in exclude), key=lambda i: collation_key(names[i]))
+        rows, buckets = np.nonzero(count[families])  # In the order of the families and buckets
+        family_rows = np.asarray(families, dtype=np.int64)[rows]
+        self._set_columns(
+            [names[i] for i in families],
+            rows,
+            cube.starts(resolution)[buckets],
+            *(cube.table(resolution, metric)[family_rows, buckets] for metric in ("count", "sum_btc", "sum_usd", "used_addresses", "known_addresses")),
+        )
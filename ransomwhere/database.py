@@ -0,0 +1,234 @@
+# SQLite store of the JSON file from the Ransomwhere website, for ad-hoc queries with SQL.
+#
+# The address records are loaded once into normalized tables:
+# - families (id, name) and addresses (id, address)
+# - records (id, family_id, address_id, created_at, updated_at, num_transactions): the address records in the order
+#   of the JSON file, including the ones without transactions
+# - transactions (id, record_id, family_id, address_id, hash, time, month, amount, amount_usd): the time is a Unix timestamp
+#   (UTC), the month is "%Y-%m" and the amount is in Satoshi (exact integers)
+# The transactions are indexed by family and time, by time and by address.
+#
+# The reports of run_stats.sh are precomputed by StatsEngine (engine.py) in the same pass over the records and stored
+# in rollup tables with the same rows as the csv files (timeline_years, timeline_months, timeline_families including
+# the "Total" rows, family_totals, general_stats and empty_address_counts), DatabaseStats reads them back.
+#
+# Like the columnar cache (see cache.py), the database is keyed by a hash of the contents of the JSON file and it is
+# written into a temporary file first, a database for an older version of the file is rebuilt.
+# Example: SELECT * FROM transactions JOIN families ON families.id = family_id
+#          WHERE name = 'Conti' AND month LIKE '2021-%' AND amount_usd > 100000
+
+import json
+import os
+import sqlite3
+import tempfile
+
+from ransomwhere.buckets import month_of
+from ransomwhere.engine import GeneralStats, StatsEngine
+from ransomwhere.reader import file_hash, file_stat, iter_records
+
+
+DATABASE_VERSION = 1
+BATCH_SIZE = 10000  # Transactions inserted with one `executemany`
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE families (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE addresses (id INTEGER PRIMARY KEY, address TEXT NOT NULL UNIQUE);
+CREATE TABLE records (
+    id INTEGER PRIMARY KEY,
+    family_id INTEGER NOT NULL REFERENCES families (id),
+    address_id INTEGER NOT NULL REFERENCES addresses (id),
+    created_at TEXT,
+    updated_at TEXT,
+    num_transactions INTEGER NOT NULL
+);
+CREATE TABLE transactions (
+    id INTEGER PRIMARY KEY,
+    record_id INTEGER NOT NULL REFERENCES records (id),
+    family_id INTEGER NOT NULL REFERENCES families (id),
+    address_id INTEGER NOT NULL REFERENCES addresses (id),
+    hash TEXT,
+    time INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    amount_usd REAL NOT NULL
+);
+CREATE TABLE timeline_years (year TEXT PRIMARY KEY, count INTEGER, sum_btc REAL, sum_usd REAL, avg_btc REAL, avg_usd REAL);
+CREATE TABLE timeline_months (month TEXT PRIMARY KEY, count INTEGER, sum_btc REAL, sum_usd REAL, avg_btc REAL, avg_usd REAL);
+CREATE TABLE timeline_families (
+    position INTEGER PRIMARY KEY,
+    family TEXT NOT NULL,
+    month TEXT NOT NULL,
+    count INTEGER,
+    sum_btc REAL,
+    sum_usd REAL,
+    used_addresses INTEGER,
+    known_addresses INTEGER
+);
+CREATE TABLE family_totals (family TEXT PRIMARY KEY, count INTEGER, sum_btc REAL, sum_usd REAL);
+CREATE TABLE general_stats (
+    num_transactions INTEGER, total_btc REAL, total_usd REAL, mean_btc REAL, mean_usd REAL, first_time INTEGER, last_time INTEGER,
+    num_families INTEGER, num_non_empty_families INTEGER, num_empty_families INTEGER, num_addresses INTEGER, num_empty_addresses INTEGER
+);
+CREATE TABLE empty_address_counts (family TEXT PRIMARY KEY, count INTEGER);
+"""
+
+# Created after the rows have been inserted, which is faster than updating the indexes for every row
+INDEXES = """
+CREATE INDEX transactions_family_time ON transactions (family_id, time);
+CREATE INDEX transactions_time ON transactions (time);
+CREATE INDEX transactions_address ON transactions (address_id);
+CREATE INDEX records_family ON records (family_id);
+CREATE INDEX records_address ON records (address_id);
+CREATE INDEX timeline_families_family ON timeline_families (family, month);
+"""
+
+
+def default_database_path(path):
+    # The database is stored next to the JSON file: data.json -> data.json.sqlite
+    return f"{path}.sqlite"
+
+
+def _insert_records(connection, records, engine):
+    families = dict()
+    addresses = dict()
+    transaction_rows = []
+    for record_id, record in enumerate(records):
+        family = record["family"]
+        address = record["address"]
+        family_id = families.get(family)
+        if family_id is None:
+            family_id = families[family] = len(families)
+            connection.execute("INSERT INTO families VALUES (?, ?)", (family_id, family))
+        address_id = addresses.get(address)
+        if address_id is None:
+            address_id = addresses[address] = len(addresses)
+            connection.execute("INSERT INTO addresses VALUES (?, ?)", (address_id, address))
+
+        transactions = record["transactions"]
+        connection.execute("INSERT INTO records VALUES (?, ?, ?, ?, ?, ?)",
+                           (record_id, family_id, address_id, record.get("createdAt"), record.get("updatedAt"), len(transactions)))
+        for transaction in transactions:
+            timestamp = transaction["time"]
+            transaction_rows.append((record_id, family_id, address_id, transaction.get("hash"), timestamp,
+                                     month_of(timestamp), transaction["amount"], transaction["amountUSD"]))
+        if len(transaction_rows) >= BATCH_SIZE:
+            _insert_transactions(connection, transaction_rows)
+            transaction_rows = []
+        engine.add(record)
+    _insert_transactions(connection, transaction_rows)
+
+
+def _insert_transactions(connection, rows):
+    connection.executemany("INSERT INTO transactions (record_id, family_id, address_id, hash, time, month, amount, amount_usd) "
+                           "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def _insert_rollups(connection, engine):
+    connection.executemany("INSERT INTO timeline_years VALUES (?, ?, ?, ?, ?, ?)", engine.timeline_years())
+    connection.executemany("INSERT INTO timeline_months VALUES (?, ?, ?, ?, ?, ?)", engine.timeline_months())
+    connection.executemany("INSERT INTO timeline_families VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                           ((position, *row) for position, row in enumerate(engine.timeline_families(totals=True))))
+    connection.executemany("INSERT INTO family_totals VALUES (?, ?, ?, ?)", engine.top_families_stats())
+    stats = engine.general_stats()
+    connection.execute("INSERT INTO general_stats VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", stats[:-1])
+    connection.executemany("INSERT INTO empty_address_counts VALUES (?, ?)", stats.empty_address_counts.items())
+
+
+def export_database(records, database_path, meta=None):
+    # Expects an iterable of address records (see reader.py), writes the database (replaces an existing one)
+    directory = os.path.dirname(os.path.abspath(database_path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".ransomwhere-database-", dir=directory)
+    os.close(fd)
+    try:
+        connection = sqlite3.connect(tmp_path)
+        try:
+            # Nothing has to survive a crash while the database is built, the temporary file is removed then
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            connection.executescript(SCHEMA)
+            engine = StatsEngine()
+            _insert_records(connection, records, engine)
+            _insert_rollups(connection, engine)
+            connection.executescript(INDEXES)
+            # The metadata is written last, a database without it is never used
+            meta = {**(meta or dict()), "version": DATABASE_VERSION}
+            connection.executemany("INSERT INTO meta VALUES (?, ?)", ((key, json.dumps(value)) for key, value in meta.items()))
+            connection.commit()
+        finally:
+            connection.close()
+        os.replace(tmp_path, database_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def read_meta(database_path):
+    if not os.path.isfile(database_path):
+        return None
+    try:
+        connection = sqlite3.connect(f"file:{database_path}?mode=ro", uri=True)
+        try:
+            return {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM meta")}
+        finally:
+            connection.close()
+    except (sqlite3.Error, ValueError):
+        return None
+
+
+def update_database(path, database_path):
+    # The database is (re)built if it does not exist yet or if it has been built for a different version of the file
+    source_stat = file_stat(path)
+    meta = read_meta(database_path)
+    if meta is None or meta.get("version") != DATABASE_VERSION or meta.get("source_stat") != source_stat:
+        source_hash = file_hash(path)
+        if meta is None or meta.get("version") != DATABASE_VERSION or meta.get("source_hash") != source_hash:
+            export_database(iter_records(path), database_path, {"source_hash": source_hash, "source_stat": source_stat})
+        else:
+            # The same contents (e.g. downloaded again or touched), the new stat saves hashing the file the next time
+            connection = sqlite3.connect(database_path)
+            try:
+                connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", ("source_stat", json.dumps(source_stat)))
+                connection.commit()
+            finally:
+                connection.close()
+
+
+def open_database(path, database_path=None):
+    # Expects the full JSON file (data.json), returns a connection to its database (the database is built if needed)
+    if database_path is None:
+        database_path = default_database_path(path)
+    update_database(path, database_path)
+    return sqlite3.connect(database_path)
+
+
+class DatabaseStats:
+    # The statistics of run_stats.sh read from the rollup tables of the database
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def general_stats(self):
+        row = self.connection.execute("SELECT * FROM general_stats").fetchone()
+        empty_address_counts = dict(self.connection.execute("SELECT family, count FROM empty_address_counts"))
+        return GeneralStats(*row, empty_address_counts=empty_address_counts)
+
+    def timeline_years(self):
+        # Rows: (year, count, sum_btc, sum_usd, avg_btc, avg_usd), sorted by year
+        return self.connection.execute("SELECT * FROM timeline_years ORDER BY year").fetchall()
+
+    def timeline_months(self):
+        # Rows: (month, count, sum_btc, sum_usd, avg_btc, avg_usd), sorted by month
+        return self.connection.execute("SELECT * FROM timeline_months ORDER BY month").fetchall()
+
+    def top_families_stats(self):
+        # Rows: (family, count, sum_btc, sum_usd), the same as `compute_stats` in compute_top_families.sh
+        return self.connection.execute("SELECT * FROM family_totals").fetchall()
+
+    def timeline_families(self, totals=True):
+        # Rows: (family, month, count, sum_btc, sum_usd, used_addresses, known_addresses), sorted by family and month
+        # The families are stored in the order of the engine (see collation_key in engine.py)
+        query = "SELECT family, month, count, sum_btc, sum_usd, used_addresses, known_addresses FROM timeline_families"
+        if not totals:
+            query += " WHERE month != 'Total'"
+        return self.connection.execute(query + " ORDER BY position").fetchall()
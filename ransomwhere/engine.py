@@ -0,0 +1,427 @@
+# Single-pass statistics engine for the Ransomwhere dataset.
+#
+# All statistics computed by run_stats.sh are accumulated while walking over the address records once:
+# - General statistics (transactions, payment sums, means, time range, addresses and families)
+# - Timeline of ransom transactions per year and per month
+# - Timeline of ransomware families per month (including the totals per family)
+#
+# The numbers are accumulated in the same way as the awk programs in run_stats.sh do,
+# so that the csv files written from the engine are identical to the ones written by the script.
+# The BTC sums are exact integer sums of the amounts in Satoshi, converted to BTC only when the rows are returned.
+#
+# With `approximate_error`, the used and known addresses of the timeline of families are estimated with HyperLogLog
+# sketches (see hll.py) instead of exact sets of addresses, so the memory does not grow with the number of addresses.
+# With `quantile_compression`, the median, p90, p99 and maximum of the ransom sizes (BTC and USD) are estimated
+# overall, per year, per month and per family with t-digests (see tdigest.py) in the same pass.
+#
+# Families, addresses and months are dictionary-encoded into integer ids (see strings.py). The address strings are packed
+# into one buffer (PackedStringTable) instead of a str object and a dict entry per address, and instead of a set of
+# addresses per (family, month) and the first month per (family, address), every (family, address) keeps one integer
+# bitmap of the months in which it has transactions, in a list indexed by the address id.
+# Measured on a synthetic export (200k transactions, 78k addresses), the retained memory is ~31 bytes per transaction
+# (~88 with a dict of address strings and dicts of bitmaps per family), mostly the address bytes and the aggregates.
+
+import time
+from array import array
+from collections import namedtuple
+from decimal import Decimal
+
+from ransomwhere import BITCOIN_FACTOR
+from ransomwhere.buckets import month_of
+from ransomwhere.hll import HyperLogLog, hash_string, precision_for_error
+from ransomwhere.strings import PackedStringTable, StringTable
+from ransomwhere.tdigest import TDigest
+
+
+QUANTILES = (0.5, 0.9, 0.99)  # The median, p90 and p99 of the ransom sizes (with `quantile_compression`)
+
+GeneralStats = namedtuple("GeneralStats", [
+    "num_transactions", "total_btc", "total_usd", "mean_btc", "mean_usd", "first_time", "last_time",
+    "num_families", "num_non_empty_families", "num_empty_families",
+    "num_addresses", "num_empty_addresses", "empty_address_counts",
+])
+
+
+def collation_key(text):
+    # Approximates the en_US.UTF-8 collation used by `sort` in run_stats.sh:
+    # punctuation and spaces are ignored and the case only matters for otherwise equal strings (lowercase first)
+    alnum = "".join(c for c in text if c.isalnum())
+    return (alnum.casefold(), alnum.swapcase(), text)
+
+
+def format_time(timestamp, fmt):
+    # Transaction timestamps are in UTC
+    return time.strftime(fmt, time.gmtime(timestamp))
+
+
+class StatsEngine:
+
+    def __init__(self, approximate_error=None, quantile_compression=None):
+        # Exact address counts in the timeline of families by default, HyperLogLog sketches with `approximate_error`
+        self.precision = precision_for_error(approximate_error) if approximate_error is not None else None
+        # The quantiles of the ransom sizes are only computed with `quantile_compression` (t-digests, see tdigest.py)
+        self.compression = quantile_compression
+
+        # Families, addresses and months are dictionary-encoded (see strings.py), the sets and dictionaries below
+        # hold the integer ids, every string is stored once
+        self.family_ids = StringTable()
+        self.address_ids = PackedStringTable()  # The addresses in one buffer, not one str object per address
+        self.month_ids = StringTable()
+
+        # General statistics
+        self.num_transactions = 0
+        self.total_satoshi = 0
+        self.total_usd = Decimal(0)  # Exact (run_stats.sh sums doubles in awk, the cents can rarely differ)
+        self.mean_sum_usd = 0.0
+        self.first_time = None
+        self.last_time = None
+        self.empty_addresses = bytearray()  # Address id -> 1 if the address has an entry without transactions
+        self.non_empty_families = set()
+        self.empty_address_counts = dict()  # Family id -> the number of address entries without transactions
+
+        # Timelines, {"2021": [count, sum_satoshi, sum_usd], ...}
+        self.years = dict()
+        self.months = dict()
+
+        # Totals per family (as in compute_top_families.sh), {family id: [count, sum_satoshi, sum_usd], ...}
+        self.family_totals = dict()
+
+        # Timeline of families, {(family id, month id): [count, sum_satoshi, sum_usd], ...}
+        # (with a sketch of the addresses as a fourth element in the approximate mode)
+        self.family_months = dict()
+        # The months of every (family, address) as a bitmap of the month ids (only in the exact mode), the used addresses
+        # of a month and the first month of an address are read from the bitmaps. Almost every address belongs to one
+        # family, so the bitmaps are kept per address id: the family of the first entry with transactions
+        # (-1 if there is none yet) and its bitmap, and the bitmaps of the other families in `other_address_months`,
+        # {(family id, address id): bitmap, ...}. Equal bitmaps share one int object (`bitmaps`)
+        self.address_family = array("i")
+        self.address_bitmaps = []
+        self.other_address_months = dict()
+        self.bitmaps = dict()
+
+        # Digests of the ransom sizes [BTC, USD] overall, per year, per month and per family id
+        self.digests = [TDigest(quantile_compression), TDigest(quantile_compression)] if quantile_compression is not None else None
+        self.year_digests = dict()
+        self.month_digests = dict()
+        self.family_digests = dict()
+
+    def add(self, record):
+        family = self.family_ids.encode(record["family"])
+        address = self._encode_address(record["address"])
+        transactions = record["transactions"]
+
+        if len(transactions) == 0:
+            self.empty_addresses[address] = 1
+            self.empty_address_counts[family] = self.empty_address_counts.get(family, 0) + 1
+            return
+        self.non_empty_families.add(family)
+
+        family_totals = self.family_totals.setdefault(family, [0, 0, 0.0])
+        if self.precision is None:
+            bitmap = self._address_bitmap(family, address)
+        else:
+            address_hash = hash_string(record["address"])
+        if self.compression is not None:
+            family_digests = _digests(self.family_digests, family, self.compression)
+        for transaction in transactions:
+            timestamp = transaction["time"]
+            amount = transaction["amount"]
+            amount_usd = transaction["amountUSD"]
+
+            self.num_transactions += 1
+            self.total_satoshi += amount
+            self.total_usd += Decimal(amount_usd)
+            self.mean_sum_usd += amount_usd
+            if self.first_time is None or timestamp < self.first_time:
+                self.first_time = timestamp
+            if self.last_time is None or timestamp > self.last_time:
+                self.last_time = timestamp
+
+            month = month_of(timestamp)
+            for timeline, key in ((self.years, month[:4]), (self.months, month)):
+                stats = timeline.get(key)
+                if stats is None:
+                    stats = timeline[key] = [0, 0, 0.0]
+                stats[0] += 1
+                stats[1] += amount
+                stats[2] += amount_usd
+
+            family_totals[0] += 1
+            family_totals[1] += amount
+            family_totals[2] += amount_usd
+
+            month_id = self.month_ids.encode(month)
+            stats = self.family_months.get((family, month_id))
+            if stats is None:
+                stats = self.family_months[(family, month_id)] = [0, 0, 0.0] if self.precision is None else [0, 0, 0.0, HyperLogLog(self.precision)]
+            stats[0] += 1
+            stats[1] += amount
+            stats[2] += amount_usd
+            if self.precision is None:
+                bitmap |= 1 << month_id
+            else:
+                stats[3].add_hash(address_hash)
+            if self.compression is not None:
+                amount_btc = amount / BITCOIN_FACTOR
+                for digests in (self.digests, family_digests, _digests(self.month_digests, month, self.compression),
+                                _digests(self.year_digests, month[:4], self.compression)):
+                    digests[0].add(amount_btc)
+                    digests[1].add(amount_usd)
+        if self.precision is None:
+            self._set_address_bitmap(family, address, bitmap)
+
+    def _encode_address(self, address):
+        i = self.address_ids.encode(address)
+        if i == len(self.empty_addresses):
+            self.empty_addresses.append(0)
+            if self.precision is None:
+                self.address_family.append(-1)
+                self.address_bitmaps.append(0)
+        return i
+
+    def _address_bitmap(self, family, address):
+        if self.address_family[address] == family:
+            return self.address_bitmaps[address]
+        return self.other_address_months.get((family, address), 0)
+
+    def _set_address_bitmap(self, family, address, bitmap):
+        bitmap = self.bitmaps.setdefault(bitmap, bitmap)
+        if self.address_family[address] in (family, -1):
+            self.address_family[address] = family
+            self.address_bitmaps[address] = bitmap
+        else:
+            self.other_address_months[(family, address)] = bitmap
+
+    def _address_bitmaps(self):
+        # Yields (family id, address id, bitmap) for every (family, address) with transactions
+        for address, (family, bitmap) in enumerate(zip(self.address_family, self.address_bitmaps)):
+            if family >= 0:
+                yield family, address, bitmap
+        for (family, address), bitmap in self.other_address_months.items():
+            yield family, address, bitmap
+
+    def add_all(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def merge(self, other):
+        # Folds the aggregates of another engine (in the same mode) into this one, as if its records came after the
+        # records of this engine, e.g. the engines of consecutive ranges of the file (see chunks.py)
+        # The other engine is not used afterwards (its sketches and digests are reused)
+        # The counts, the BTC sums and the addresses are exact, the USD sums can differ in the last digits from adding
+        # the transactions one by one (like in IncrementalStats)
+        if (other.precision, other.compression) != (self.precision, self.compression):
+            raise ValueError("Cannot merge engines with different approximate_error or quantile_compression")
+
+        # The ids of the other engine -> the ids of this engine (new strings get the next ids, as if added here)
+        families = [self.family_ids.encode(family) for family in other.family_ids.strings]
+        addresses = [self._encode_address(address) for address in other.address_ids]
+        months = [self.month_ids.encode(month) for month in other.month_ids.strings]
+
+        self.num_transactions += other.num_transactions
+        self.total_satoshi += other.total_satoshi
+        self.total_usd += other.total_usd
+        self.mean_sum_usd += other.mean_sum_usd
+        if other.first_time is not None and (self.first_time is None or other.first_time < self.first_time):
+            self.first_time = other.first_time
+        if other.last_time is not None and (self.last_time is None or other.last_time > self.last_time):
+            self.last_time = other.last_time
+        for address, empty in enumerate(other.empty_addresses):
+            if empty:
+                self.empty_addresses[addresses[address]] = 1
+        self.non_empty_families.update(families[family] for family in other.non_empty_families)
+        for family, count in other.empty_address_counts.items():
+            family = families[family]
+            self.empty_address_counts[family] = self.empty_address_counts.get(family, 0) + count
+
+        for timeline, other_timeline in ((self.years, other.years), (self.months, other.months)):
+            for key, (count, satoshi, sum_usd) in other_timeline.items():
+                stats = timeline.setdefault(key, [0, 0, 0.0])
+                stats[0] += count
+                stats[1] += satoshi
+                stats[2] += sum_usd
+        for family, (count, satoshi, sum_usd) in other.family_totals.items():
+            stats = self.family_totals.setdefault(families[family], [0, 0, 0.0])
+            stats[0] += count
+            stats[1] += satoshi
+            stats[2] += sum_usd
+        for (family, month), other_stats in other.family_months.items():
+            key = (families[family], months[month])
+            stats = self.family_months.get(key)
+            if stats is None:
+                self.family_months[key] = other_stats
+                continue
+            stats[0] += other_stats[0]
+            stats[1] += other_stats[1]
+            stats[2] += other_stats[2]
+            if self.precision is not None:
+                stats[3].merge(other_stats[3])
+
+        # The bitmaps are translated bit by bit into the month ids of this engine (most bitmaps are the same few months)
+        translated = {0: 0}
+        for family, address, bitmap in other._address_bitmaps():
+            new_bitmap = translated.get(bitmap)
+            if new_bitmap is None:
+                new_bitmap = 0
+                rest = bitmap
+                while rest:
+                    lowest = rest & -rest
+                    new_bitmap |= 1 << months[lowest.bit_length() - 1]
+                    rest ^= lowest
+                translated[bitmap] = new_bitmap
+            family = families[family]
+            address = addresses[address]
+            self._set_address_bitmap(family, address, self._address_bitmap(family, address) | new_bitmap)
+
+        if self.compression is not None:
+            for digest, other_digest in zip(self.digests, other.digests):
+                digest.merge(other_digest)
+            _merge_digests(self.year_digests, other.year_digests, lambda year: year)
+            _merge_digests(self.month_digests, other.month_digests, lambda month: month)
+            _merge_digests(self.family_digests, other.family_digests, families.__getitem__)
+        return self
+
+    def general_stats(self):
+        # The general statistics printed by `print_general_stats` in run_stats.sh
+        total_btc = self.total_satoshi / BITCOIN_FACTOR
+        return GeneralStats(
+            num_transactions=self.num_transactions,
+            total_btc=total_btc,
+            total_usd=float(self.total_usd),
+            mean_btc=total_btc / self.num_transactions if self.num_transactions > 0 else None,
+            mean_usd=self.mean_sum_usd / self.num_transactions if self.num_transactions > 0 else None,
+            first_time=self.first_time,
+            last_time=self.last_time,
+            num_families=len(self.family_ids),
+            num_non_empty_families=len(self.non_empty_families),
+            num_empty_families=len(self.family_ids) - len(self.non_empty_families),
+            num_addresses=len(self.address_ids),
+            num_empty_addresses=self.empty_addresses.count(1),
+            empty_address_counts={self.family_ids[family]: count for family, count in self.empty_address_counts.items()},
+        )
+
+    def timeline_years(self):
+        # Rows: (year, count, sum_btc, sum_usd, avg_btc, avg_usd), sorted by year
+        return _timeline_rows(self.years)
+
+    def timeline_months(self):
+        # Rows: (month, count, sum_btc, sum_usd, avg_btc, avg_usd), sorted by month
+        return _timeline_rows(self.months)
+
+    def top_families_stats(self):
+        # Rows: (family, count, sum_btc, sum_usd), the same as `compute_stats` in compute_top_families.sh
+        return [(self.family_ids[family], count, satoshi / BITCOIN_FACTOR, sum_usd)
+                for family, (count, satoshi, sum_usd) in self.family_totals.items()]
+
+    def timeline_families(self, totals=True):
+        # Rows: (family, month, count, sum_btc, sum_usd, used_addresses, known_addresses), sorted by family and month
+        # After the months of each family there is a row with month "Total" (if `totals` is set)
+        # Only the aggregated (family, month) keys are sorted, not the transactions
+        months_by_family = dict()
+        for family, month in self.family_months:
+            months_by_family.setdefault(family, []).append(month)
+        bitmaps_by_family = dict()
+        if self.precision is None:
+            for family, _, bitmap in self._address_bitmaps():
+                bitmaps_by_family.setdefault(family, []).append(bitmap)
+
+        labels = self.month_ids.strings
+        rows = []
+        for family in sorted(months_by_family, key=lambda family: collation_key(self.family_ids[family])):
+            name = self.family_ids[family]
+            if self.precision is None:
+                used, new_known = _address_month_counts(bitmaps_by_family.get(family, ()), labels)
+
+            # One ordered sweep over the months of the family for the known addresses (a cumulative count)
+            # In the approximate mode, the known addresses are the estimate of the union of the sketches so far
+            known = 0
+            union = None
+            for month in sorted(months_by_family[family], key=labels.__getitem__):
+                count, satoshi, sum_usd = self.family_months[(family, month)][:3]
+                if self.precision is None:
+                    known += new_known.get(month, 0)
+                    num_used = used[month]
+                else:
+                    sketch = self.family_months[(family, month)][3]
+                    union = sketch.copy() if union is None else union.merge(sketch)
+                    known = union.estimate()
+                    num_used = sketch.estimate()
+                rows.append((name, labels[month], count, satoshi / BITCOIN_FACTOR, sum_usd, num_used, known))
+            if totals:
+                # Here total used addresses and total known addresses are the same (we know all addresses they have used)
+                count, satoshi, sum_usd = self.family_totals[family]
+                rows.append((name, "Total", count, satoshi / BITCOIN_FACTOR, sum_usd, known, known))
+        return rows
+
+    def quantiles(self):
+        # Row: (count, median_btc, p90_btc, p99_btc, max_btc, median_usd, p90_usd, p99_usd, max_usd) over all transactions
+        return _quantile_row(self.digests)
+
+    def quantiles_years(self):
+        # Rows: (year, count, median_btc, p90_btc, p99_btc, max_btc, median_usd, p90_usd, p99_usd, max_usd), sorted by year
+        return [(year, *_quantile_row(self.year_digests[year])) for year in sorted(self.year_digests)]
+
+    def quantiles_months(self):
+        # Rows: (month, count, ...) as in quantiles_years, sorted by month
+        return [(month, *_quantile_row(self.month_digests[month])) for month in sorted(self.month_digests)]
+
+    def quantiles_families(self):
+        # Rows: (family, count, ...) as in quantiles_years, sorted by family (like the timeline of families)
+        families = sorted(self.family_digests, key=lambda family: collation_key(self.family_ids[family]))
+        return [(self.family_ids[family], *_quantile_row(self.family_digests[family])) for family in families]
+
+
+def _address_month_counts(bitmaps, labels):
+    # Returns the number of used addresses per month id and the number of addresses known for the first time per month id
+    used = dict()
+    new_known = dict()
+    for bitmap in bitmaps:
+        first = None
+        while bitmap:
+            lowest = bitmap & -bitmap
+            month = lowest.bit_length() - 1
+            bitmap ^= lowest
+            used[month] = used.get(month, 0) + 1
+            # The month ids are in the order of appearance, not in the order of the months
+            if first is None or labels[month] < labels[first]:
+                first = month
+        new_known[first] = new_known.get(first, 0) + 1
+    return used, new_known
+
+
+def _digests(digests, key, compression):
+    pair = digests.get(key)
+    if pair is None:
+        pair = digests[key] = [TDigest(compression), TDigest(compression)]
+    return pair
+
+
+def _merge_digests(digests, other_digests, key_map):
+    # Merges the pairs of digests of another engine into the pairs with the mapped keys
+    for key, pair in other_digests.items():
+        key = key_map(key)
+        if key in digests:
+            for digest, other_digest in zip(digests[key], pair):
+                digest.merge(other_digest)
+        else:
+            digests[key] = pair
+
+
+def _quantile_row(digests):
+    btc, usd = digests
+    return (btc.count, *(btc.quantile(q) for q in QUANTILES), btc.maximum(), *(usd.quantile(q) for q in QUANTILES), usd.maximum())
+
+
+def _timeline_rows(timeline):
+    rows = []
+    for key in sorted(timeline):
+        count, satoshi, sum_usd = timeline[key]
+        sum_btc = satoshi / BITCOIN_FACTOR
+        rows.append((key, count, sum_btc, sum_usd, sum_btc / count, sum_usd / count))
+    return rows
+
+
+def compute_stats(records, approximate_error=None, quantile_compression=None):
+    # Expects an iterable of address records (see reader.py), computes all statistics in one pass
+    return StatsEngine(approximate_error, quantile_compression).add_all(records)
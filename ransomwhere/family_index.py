@@ -0,0 +1,120 @@
+# Persistent index family -> address records -> transactions, stored in the columnar cache (see cache.py).
+#
+# `print_transactions_for_family` in run_stats.sh parses the whole JSON file for every queried family.
+# The index is built once from the columns of the cache and answers the same question for any number of families
+# by looking up precomputed arrays (only the index and families.json are read, not the columns):
+# - family_record_offsets, family_records: the address records of family i are
+#   family_records[family_record_offsets[i]:family_record_offsets[i + 1]] (in the order of the JSON file)
+# - record_offsets: the transactions of record j are the rows record_offsets[j]:record_offsets[j + 1] of the columns
+# - family_unique_addresses, family_transactions: the answers of `print_transactions_for_family` for every family
+# Like the shell function, the transactions of duplicate address records are counted for every record.
+
+import json
+import os
+
+import numpy as np
+
+from ransomwhere.cache import StringTable, default_cache_dir, load_columns, update_cache
+
+
+INDEX_VERSION = 1
+INDEX_ARRAYS = ("family_record_offsets", "family_records", "record_offsets", "family_unique_addresses", "family_transactions")
+
+
+def _offsets(counts):
+    offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def build_index(columns):
+    # Returns the arrays of the index for the columns of the cache
+    num_families = len(columns.families)
+    record_family = np.asarray(columns.record_family, dtype=np.int64)
+    record_address = np.asarray(columns.record_address, dtype=np.int64)
+    record_transactions = np.asarray(columns.record_transactions, dtype=np.int64)
+
+    # Unique (family, address) pairs, counted per family
+    num_addresses = max(len(columns.addresses), 1)
+    pairs = np.unique(record_family * num_addresses + record_address)
+    unique_addresses = np.bincount(pairs // num_addresses, minlength=num_families)
+
+    return {
+        "family_record_offsets": _offsets(np.bincount(record_family, minlength=num_families)),
+        "family_records": np.argsort(record_family, kind="stable").astype(np.int64),
+        "record_offsets": _offsets(record_transactions),
+        "family_unique_addresses": unique_addresses.astype(np.int64),
+        "family_transactions": np.bincount(record_family, weights=record_transactions, minlength=num_families).astype(np.int64),
+    }
+
+
+def save_index(arrays, cache_dir):
+    # The arrays are written first and index.json last, an index without it is rebuilt
+    for name in INDEX_ARRAYS:
+        tmp_path = os.path.join(cache_dir, f".{name}.npy")
+        np.save(tmp_path, arrays[name])
+        os.replace(tmp_path, os.path.join(cache_dir, f"{name}.npy"))
+    with open(os.path.join(cache_dir, "index.json"), "w") as file:
+        json.dump({"version": INDEX_VERSION}, file)
+
+
+def _index_exists(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, "index.json"), "r") as file:
+            return json.load(file).get("version") == INDEX_VERSION
+    except (OSError, ValueError):
+        return False
+
+
+class FamilyIndex:
+
+    def __init__(self, arrays, families):
+        self.arrays = arrays
+        self.families = families
+
+    def _family_id(self, family):
+        return self.families.get(family)
+
+    def query(self, family):
+        # Returns (the number of unique addresses, the number of transactions) of the family, (0, 0) for unknown families
+        i = self._family_id(family)
+        if i is None:
+            return 0, 0
+        return int(self.arrays["family_unique_addresses"][i]), int(self.arrays["family_transactions"][i])
+
+    def records(self, family):
+        # Returns the indices of the address records of the family (in the order of the JSON file)
+        i = self._family_id(family)
+        if i is None:
+            return np.empty(0, dtype=np.int64)
+        offsets = self.arrays["family_record_offsets"]
+        return self.arrays["family_records"][offsets[i]:offsets[i + 1]]
+
+    def transactions(self, family):
+        # Returns the rows of the transactions of the family in the columns of the cache (in the order of the JSON file)
+        records = self.records(family)
+        if len(records) == 0:
+            return np.empty(0, dtype=np.int64)
+        offsets = self.arrays["record_offsets"]
+        starts = offsets[records]
+        lengths = offsets[records + 1] - starts
+        ends = np.cumsum(lengths)
+        # The rows of every record are consecutive: shift 0..n-1 by the start of the record (minus its position)
+        return np.arange(ends[-1]) + np.repeat(starts - (ends - lengths), lengths)
+
+
+def load_index(cache_dir):
+    arrays = {name: np.load(os.path.join(cache_dir, f"{name}.npy"), mmap_mode="r") for name in INDEX_ARRAYS}
+    with open(os.path.join(cache_dir, "families.json"), "r") as file:
+        families = StringTable(json.load(file))
+    return FamilyIndex(arrays, families)
+
+
+def open_index(path, cache_dir=None):
+    # Expects the full JSON file (data.json), returns the index from the cache (the cache and the index are built if needed)
+    if cache_dir is None:
+        cache_dir = default_cache_dir(path)
+    update_cache(path, cache_dir)
+    if not _index_exists(cache_dir):
+        save_index(build_index(load_columns(cache_dir)), cache_dir)
+    return load_index(cache_dir)
@@ -0,0 +1,99 @@
+# HyperLogLog sketches for approximate distinct counts of addresses (see StatsEngine with `approximate_error`).
+#
+# The exact timeline of families keeps the set of addresses of every (family, month) and the first month of every
+# (family, address), which grows with the number of addresses. A sketch has a bounded size (2^precision bytes)
+# and the sketches are mergeable: the union of two sketches is the register-wise maximum, so the known addresses
+# are the cumulative union of the sketches of the months and sketches from different shards can be combined.
+#
+# Small sketches are sparse (the exact set of the 64-bit hashes), they are converted into registers when they grow,
+# so families and months with few addresses stay exact. The relative standard error of the registers is 1.04 / sqrt(2^precision).
+# The hashes are stable across processes (blake2b, not the randomized `hash`).
+# NumPy is only imported for the registers, so the exact mode of the engine works without it.
+
+import hashlib
+import math
+
+
+MIN_PRECISION = 4
+MAX_PRECISION = 18
+
+
+def precision_for_error(error):
+    # The smallest precision with a relative standard error of at most `error`
+    precision = math.ceil(2 * math.log2(1.04 / error))
+    return min(max(precision, MIN_PRECISION), MAX_PRECISION)
+
+
+def hash_string(string):
+    return int.from_bytes(hashlib.blake2b(string.encode(), digest_size=8).digest(), "little")
+
+
+class HyperLogLog:
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.hashes = set()  # Sparse representation, None after the conversion into registers
+        self.registers = None
+
+    def _rank(self, value):
+        # The index of the register and the position of the first 1-bit in the remaining bits
+        bits = 64 - self.precision
+        index = value >> bits
+        rest = value & ((1 << bits) - 1)
+        return index, bits - rest.bit_length() + 1
+
+    def _to_registers(self):
+        import numpy as np
+        self.registers = np.zeros(1 << self.precision, dtype=np.uint8)
+        for value in self.hashes:
+            index, rank = self._rank(value)
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+        self.hashes = None
+
+    def add_hash(self, value):
+        # Expects a 64-bit hash (see hash_string)
+        if self.hashes is not None:
+            self.hashes.add(value)
+            # A hash in a set takes roughly 64 bytes, a register one byte
+            if len(self.hashes) > (1 << self.precision) // 64:
+                self._to_registers()
+        else:
+            index, rank = self._rank(value)
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+
+    def add(self, string):
+        self.add_hash(hash_string(string))
+
+    def merge(self, other):
+        # The union of both sketches (in place), the sketches must have the same precision
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge sketches with precisions {self.precision} and {other.precision}")
+        if other.hashes is not None:
+            for value in other.hashes:
+                self.add_hash(value)
+            return self
+        if self.hashes is not None:
+            self._to_registers()
+        import numpy as np
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def copy(self):
+        sketch = HyperLogLog(self.precision)
+        sketch.hashes = set(self.hashes) if self.hashes is not None else None
+        sketch.registers = self.registers.copy() if self.registers is not None else None
+        return sketch
+
+    def estimate(self):
+        if self.hashes is not None:
+            return len(self.hashes)
+        import numpy as np
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * math.log(m / zeros)  # Linear counting for small cardinalities
+        return int(round(estimate))
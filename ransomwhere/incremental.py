@@ -0,0 +1,242 @@
+# Incremental statistics for new versions of the JSON file from the Ransomwhere website.
+#
+# Every new export is mostly the previous one plus a few new transactions. Instead of recomputing everything,
+# the aggregates are kept in a state file and only the address records that changed are folded into them:
+# - Address records are identified by (family, address, occurrence), the occurrence distinguishes address records
+#   with the same family and address in one export (every record is counted, like in a full pass)
+# - Records with the same `updatedAt` and the same transaction hashes as in the previous export are skipped
+#   (the hashes also catch a duplicate record that moved to another occurrence)
+# - The previous transactions of a changed record are subtracted from the aggregates and its new transactions are added,
+#   so the state keeps the transactions of every record (the contribution of the record)
+# - Records that are not in the new export anymore (e.g. an address moved to another family) are subtracted
+#
+# The BTC sums are kept in Satoshi and the USD sums as decimals, so they do not depend on the order in which
+# the transactions arrive and can be subtracted again exactly.
+
+import os
+import pickle
+import tempfile
+from decimal import Decimal
+
+from ransomwhere import BITCOIN_FACTOR
+from ransomwhere.buckets import month_of
+from ransomwhere.engine import GeneralStats, collation_key
+
+
+STATE_VERSION = 2
+
+
+class IncrementalStats:
+
+    def __init__(self):
+        # (family, address, occurrence) -> (updatedAt, transactions as (hash, time, amount, amountUSD), first time, last time)
+        self.records = dict()
+
+        self.num_transactions = 0
+        self.total_satoshi = 0
+        self.total_usd = Decimal(0)
+
+        # Timelines, {"2021": [count, sum_satoshi, sum_usd], ...}
+        self.years = dict()
+        self.months = dict()
+
+        # (family, month) -> [count, sum_satoshi, sum_usd]
+        self.family_months = dict()
+        # (family, month, address) -> the number of transactions, the used addresses of a month and the first month
+        # of an address are read from the keys
+        self.address_months = dict()
+
+    def update(self, records):
+        # Folds the changes of the export (an iterable of all its address records) into the aggregates
+        # Returns the number of new transactions, the number of new or changed address records and the number of
+        # removed address records
+        new_transactions = 0
+        changed_records = 0
+        occurrences = dict()
+        for record in records:
+            family = record["family"]
+            address = record["address"]
+            updated_at = record.get("updatedAt")
+
+            occurrence = occurrences.get((family, address), 0)
+            occurrences[(family, address)] = occurrence + 1
+            key = (family, address, occurrence)
+            previous = self.records.get(key)
+            if (previous is not None and previous[0] == updated_at and len(previous[1]) == len(record["transactions"])
+                    and all(old[0] == transaction["hash"] for old, transaction in zip(previous[1], record["transactions"]))):
+                continue
+            changed_records += 1
+
+            transactions = tuple((transaction["hash"], transaction["time"], transaction["amount"], transaction["amountUSD"])
+                                 for transaction in record["transactions"])
+            known_hashes = set()
+            if previous is not None:
+                self._fold(family, address, previous[1], -1)
+                known_hashes = {transaction[0] for transaction in previous[1]}
+            self._fold(family, address, transactions, 1)
+            new_transactions += sum(1 for transaction in transactions if transaction[0] not in known_hashes)
+            times = [transaction[1] for transaction in transactions]
+            self.records[key] = (updated_at, transactions, min(times, default=None), max(times, default=None))
+
+        # The records of the previous export that are not in this one (the occurrences are the ones of this export)
+        removed = [key for key in self.records if occurrences.get(key[:2], 0) <= key[2]]
+        for key in removed:
+            family, address, _ = key
+            self._fold(family, address, self.records.pop(key)[1], -1)
+        return new_transactions, changed_records, len(removed)
+
+    def _fold(self, family, address, transactions, sign):
+        # Adds (sign 1) or subtracts (sign -1) the transactions of an address record, the entries of the aggregates
+        # without transactions are removed
+        for _, timestamp, amount, amount_usd in transactions:
+            amount_usd = Decimal(amount_usd)
+            self.num_transactions += sign
+            self.total_satoshi += sign * amount
+            self.total_usd += sign * amount_usd
+
+            month = month_of(timestamp)
+            for aggregate, key in ((self.years, month[:4]), (self.months, month), (self.family_months, (family, month))):
+                stats = aggregate.get(key)
+                if stats is None:
+                    stats = aggregate[key] = [0, 0, Decimal(0)]
+                stats[0] += sign
+                stats[1] += sign * amount
+                stats[2] += sign * amount_usd
+                if stats[0] == 0:
+                    del aggregate[key]
+
+            key = (family, month, address)
+            count = self.address_months.get(key, 0) + sign
+            if count == 0:
+                del self.address_months[key]
+            else:
+                self.address_months[key] = count
+
+    def general_stats(self):
+        # The general statistics printed by `print_general_stats` in run_stats.sh
+        families = set()
+        non_empty_families = set()
+        addresses = set()
+        empty_addresses = set()
+        empty_address_counts = dict()
+        first_time = None
+        last_time = None
+        for (family, address, _), (_, transactions, first, last) in self.records.items():
+            families.add(family)
+            addresses.add(address)
+            if len(transactions) == 0:
+                empty_addresses.add(address)
+                empty_address_counts[family] = empty_address_counts.get(family, 0) + 1
+                continue
+            non_empty_families.add(family)
+            if first_time is None or first < first_time:
+                first_time = first
+            if last_time is None or last > last_time:
+                last_time = last
+
+        total_btc = self.total_satoshi / BITCOIN_FACTOR
+        total_usd = float(self.total_usd)
+        return GeneralStats(
+            num_transactions=self.num_transactions,
+            total_btc=total_btc,
+            total_usd=total_usd,
+            mean_btc=total_btc / self.num_transactions if self.num_transactions > 0 else None,
+            mean_usd=total_usd / self.num_transactions if self.num_transactions > 0 else None,
+            first_time=first_time,
+            last_time=last_time,
+            num_families=len(families),
+            num_non_empty_families=len(non_empty_families),
+            num_empty_families=len(families - non_empty_families),
+            num_addresses=len(addresses),
+            num_empty_addresses=len(empty_addresses),
+            empty_address_counts=empty_address_counts,
+        )
+
+    def timeline_years(self):
+        # Rows: (year, count, sum_btc, sum_usd, avg_btc, avg_usd), sorted by year
+        return _timeline_rows(self.years)
+
+    def timeline_months(self):
+        # Rows: (month, count, sum_btc, sum_usd, avg_btc, avg_usd), sorted by month
+        return _timeline_rows(self.months)
+
+    def top_families_stats(self):
+        # Rows: (family, count, sum_btc, sum_usd), the same as `compute_stats` in compute_top_families.sh
+        totals = dict()
+        for (family, _), (count, satoshi, usd) in self.family_months.items():
+            total = totals.setdefault(family, [0, 0, Decimal(0)])
+            total[0] += count
+            total[1] += satoshi
+            total[2] += usd
+        return [(family, count, satoshi / BITCOIN_FACTOR, float(usd)) for family, (count, satoshi, usd) in totals.items()]
+
+    def timeline_families(self, totals=True):
+        # Rows: (family, month, count, sum_btc, sum_usd, used_addresses, known_addresses), sorted by family and month
+        # After the months of each family there is a row with month "Total" (if `totals` is set)
+        by_family = dict()
+        for (family, month) in self.family_months:
+            by_family.setdefault(family, []).append(month)
+
+        # The number of used addresses in each month and the first month of every address
+        used = dict()
+        first_months = dict()
+        for family, month, address in self.address_months:
+            used[(family, month)] = used.get((family, month), 0) + 1
+            first_month = first_months.get((family, address))
+            if first_month is None or month < first_month:
+                first_months[(family, address)] = month
+
+        # The number of addresses that are known for the first time in each month
+        new_known = dict()
+        for (family, _), month in first_months.items():
+            new_known[(family, month)] = new_known.get((family, month), 0) + 1
+
+        rows = []
+        for family in sorted(by_family, key=collation_key):
+            known = 0
+            total = [0, 0, Decimal(0)]
+            for month in sorted(by_family[family]):
+                count, satoshi, usd = self.family_months[(family, month)]
+                known += new_known.get((family, month), 0)
+                rows.append((family, month, count, satoshi / BITCOIN_FACTOR, float(usd), used[(family, month)], known))
+                total[0] += count
+                total[1] += satoshi
+                total[2] += usd
+            if totals:
+                # Here total used addresses and total known addresses are the same (we know all addresses they have used)
+                rows.append((family, "Total", total[0], total[1] / BITCOIN_FACTOR, float(total[2]), known, known))
+        return rows
+
+
+def _timeline_rows(timeline):
+    rows = []
+    for key in sorted(timeline):
+        count, satoshi, sum_usd = timeline[key]
+        sum_btc = satoshi / BITCOIN_FACTOR
+        sum_usd = float(sum_usd)
+        rows.append((key, count, sum_btc, sum_usd, sum_btc / count, sum_usd / count))
+    return rows
+
+
+def load_state(path):
+    # Returns the saved state, or an empty state if there is no state file yet
+    if not os.path.exists(path):
+        return IncrementalStats()
+    with open(path, "rb") as file:
+        version, state = pickle.load(file)
+    if version != STATE_VERSION:
+        raise ValueError(f"State file {path} has version {version}, expected {STATE_VERSION} (remove it to rebuild the state)")
+    return state
+
+
+def save_state(state, path):
+    # The state is written into a temporary file first, so that an interrupted run never leaves a broken state file
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".ransomwhere-state-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump((STATE_VERSION, state), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,141 @@
+# Vectorized loading of the csv files written by run_stats.sh (and run_stats.py) for the plotting scripts.
+#
+# The csv files are parsed in bulk into NumPy arrays (no `strptime` per row):
+# - Months as datetime64[M]
+# - Counts and address counts as int64, sums and averages as float64
+# - Families as categorical codes (indices into the list of family names, in the order of the csv file)
+# The rows of every family are contiguous, so the series of a family are views into the arrays, not copies.
+# For the heatmap of the families (see plots.py), a column can also be spread into a dense family x month matrix.
+
+import numpy as np
+
+
+# The file is assumed to be comma-separated (i.e. in the csv format)
+FILE_SEPARATOR = ","
+
+
+def _read_columns(path, num_columns):
+    # Returns the columns of the csv file (without the header) as arrays of strings
+    table = np.loadtxt(path, delimiter=FILE_SEPARATOR, dtype=str, skiprows=1, ndmin=2, comments=None, encoding="utf-8")
+    if table.size == 0:
+        return np.empty((num_columns, 0), dtype=str)
+    return table.T
+
+
+class MonthTimeline:
+    # Format: Month,Count,Sum (BTC),Sum (USD),Average (BTC),Average (USD)
+    # Example: 2017-12,1,0.166500,1940.92,0.166500,1940.92
+
+    def __init__(self, path):
+        columns = _read_columns(path, 6)
+        self._set_columns(
+            columns[0].astype("datetime64[M]"),
+            columns[1].astype(np.int64),
+            columns[2].astype(np.float64),
+            columns[3].astype(np.float64),
+            columns[4].astype(np.float64),
+            columns[5].astype(np.float64),
+        )
+
+    def _set_columns(self, month, count, sum_btc, sum_usd, avg_btc, avg_usd):
+        # The month is the start of the bucket, other resolutions than months are possible (see cube.py)
+        self.month = month
+        self.count = count
+        self.sum_btc = sum_btc
+        self.sum_usd = sum_usd
+        self.avg_btc = avg_btc
+        self.avg_usd = avg_usd
+
+    def __len__(self):
+        return len(self.month)
+
+
+class FamilyTimeline:
+    # Format: Family,Month,Count,Sum (BTC),Sum (USD),Used Addresses,Known Addresses
+    # Example: Conti,2017-12,1,0.166500,1940.92,1,1
+    # The rows with the totals ("Total" instead of the month) are skipped, in case they are present in the csv file
+
+    METRICS = ("count", "sum_btc", "sum_usd", "used_addresses", "known_addresses")
+
+    def __init__(self, path, exclude=()):
+        columns = _read_columns(path, 7)
+        keep = (columns[1] != "Total") & ~np.isin(columns[0], list(exclude))
+        columns = columns[:, keep]
+
+        # Categorical codes in the order of the first appearance of the family in the file
+        names, first_index, codes = np.unique(columns[0], return_index=True, return_inverse=True)
+        order = np.argsort(first_index)
+        rank = np.empty(len(names), dtype=np.int64)
+        rank[order] = np.arange(len(names))
+        codes = rank[codes.ravel()]
+
+        # Make the rows of each family contiguous (a no-op for the files written by run_stats.sh)
+        rows = np.argsort(codes, kind="stable")
+        if not np.array_equal(rows, np.arange(len(rows))):
+            codes = codes[rows]
+            columns = columns[:, rows]
+
+        self._set_columns(
+            [str(name) for name in names[order]],
+            codes,
+            columns[1].astype("datetime64[M]"),
+            columns[2].astype(np.int64),
+            columns[3].astype(np.float64),
+            columns[4].astype(np.float64),
+            columns[5].astype(np.int64),
+            columns[6].astype(np.int64),
+        )
+
+    def _set_columns(self, families, codes, month, count, sum_btc, sum_usd, used_addresses, known_addresses):
+        # Expects the rows of every family to be contiguous (the codes are sorted)
+        # The month is the start of the bucket, other resolutions than months are possible (see cube.py)
+        self.families = families
+        self.codes = codes
+        self.month = month
+        self.count = count
+        self.sum_btc = sum_btc
+        self.sum_usd = sum_usd
+        self.used_addresses = used_addresses
+        self.known_addresses = known_addresses
+
+        # The rows of the family with code i are offsets[i]:offsets[i + 1]
+        self.offsets = np.zeros(len(self.families) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(codes, minlength=len(self.families)), out=self.offsets[1:])
+        self.index = {family: i for i, family in enumerate(self.families)}
+
+    def __len__(self):
+        return len(self.families)
+
+    def rows(self, family):
+        i = self.index[family]
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def series(self, family, metric):
+        # Returns a view of the column `metric` (e.g. "month" or "sum_usd") for the family
+        return getattr(self, metric)[self.rows(family)]
+
+    def totals(self, metric):
+        # Returns the sum of the column `metric` for every family (in the order of `families`)
+        return np.add.reduceat(getattr(self, metric), self.offsets[:-1]) if len(self.families) > 0 else np.empty(0)
+
+    def maxima(self, metric):
+        # Returns the maximum of the column `metric` for every family (in the order of `families`)
+        return np.maximum.reduceat(getattr(self, metric), self.offsets[:-1]) if len(self.families) > 0 else np.empty(0)
+
+    def buckets(self):
+        # Returns all months from the first until the last one (the months without transactions included)
+        # The step is the greatest common divisor of the gaps, so that other resolutions of the cube work as well
+        buckets = np.unique(self.month)
+        if len(buckets) < 2:
+            return buckets
+        step = np.gcd.reduce(np.diff(buckets).astype(np.int64))
+        return np.arange(buckets[0], buckets[-1] + step, step)
+
+    def matrix(self, metric, buckets=None):
+        # Returns the column `metric` as a dense matrix (a row for every family in the order of `families`,
+        # a column for every month of `buckets`), zero where the family has no transactions
+        if buckets is None:
+            buckets = self.buckets()
+        matrix = np.zeros((len(self.families), len(buckets)), dtype=getattr(self, metric).dtype)
+        matrix[self.codes, np.searchsorted(buckets, self.month)] = getattr(self, metric)
+        return matrix
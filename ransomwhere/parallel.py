@@ -0,0 +1,90 @@
+# Multi-core aggregation of the statistics per ransomware family.
+#
+# The statistics of different families are independent, so the families are split into shards that are aggregated
+# in parallel by a pool of processes. The rows of the transactions are grouped by shard once in the main process
+# (one stable sort of the small shard ids), every worker gets only the indices of the rows of its shard and reads them
+# from the memory-mapped columnar cache itself (see cache.py), so the work does not grow with the number of workers
+# and no transactions are sent between the processes, only the indices and the resulting rows.
+# The shards are balanced by the number of transactions, since the sizes of the families are very skewed.
+#
+# The results are identical to the ones computed by a single process (the transactions of a family are always
+# aggregated in the original order by one worker).
+
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ransomwhere.cache import load_columns
+from ransomwhere.columnar import ColumnarStats
+from ransomwhere.engine import collation_key
+
+
+def assign_shards(family_sizes, num_shards):
+    # Greedy balancing: the largest family goes to the shard with the fewest transactions so far
+    shards = [(0, i, []) for i in range(num_shards)]
+    for family in sorted(np.flatnonzero(family_sizes), key=lambda family: family_sizes[family], reverse=True):
+        size, i, families = heapq.heappop(shards)
+        families.append(int(family))
+        heapq.heappush(shards, (size + int(family_sizes[family]), i, families))
+    return [families for _, _, families in sorted(shards, key=lambda shard: shard[1]) if families]
+
+
+def shard_rows(family, shards, num_families):
+    # Returns the indices of the transactions of every shard (in the order of the file)
+    shard_of_family = np.zeros(num_families, dtype=np.uint16 if len(shards) <= 1 << 16 else np.int64)
+    for i, families in enumerate(shards):
+        shard_of_family[families] = i
+    shard_of_row = shard_of_family[family]
+    # A stable sort keeps the order of the file within a shard (a radix sort for the small integer shard ids)
+    order = np.argsort(shard_of_row, kind="stable")
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(shard_of_row, minlength=len(shards)))))
+    return [order[offsets[i]:offsets[i + 1]] for i in range(len(shards))]
+
+
+def _shard_timeline(cache_dir, rows):
+    return ColumnarStats(load_columns(cache_dir, addresses=False), rows).timeline_families(totals=True)
+
+
+def _shard_totals(cache_dir, rows):
+    return ColumnarStats(load_columns(cache_dir, addresses=False), rows).top_families_stats()
+
+
+class ShardedStats(ColumnarStats):
+    # The general statistics and the timelines per year and month are vectorized over all transactions
+    # in the main process, the timeline of families (run_stats.py) and the family totals (compute_top_families.py)
+    # are computed by the workers, each of them only when it is needed
+
+    def __init__(self, columns, cache_dir, workers):
+        super().__init__(columns)
+        self.cache_dir = cache_dir
+        self.workers = workers
+        family_sizes = np.bincount(self.family, minlength=len(columns.families))
+        self.shards = assign_shards(family_sizes, workers)
+        self.rows = shard_rows(self.family, self.shards, len(columns.families))
+
+        self.family_rows = None  # Family -> the rows of its timeline (including the totals)
+        self.family_totals = None
+
+    def _map_shards(self, function):
+        # Returns the results of the function for every shard (in the order of the shards)
+        if not self.shards:
+            return []
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(self.shards))) as executor:
+            return list(executor.map(function, [self.cache_dir] * len(self.shards), self.rows))
+
+    def top_families_stats(self):
+        if self.family_totals is None:
+            self.family_totals = [row for totals in self._map_shards(_shard_totals) for row in totals]
+        return list(self.family_totals)
+
+    def timeline_families(self, totals=True):
+        if self.family_rows is None:
+            self.family_rows = dict()
+            for shard_rows in self._map_shards(_shard_timeline):
+                for row in shard_rows:
+                    self.family_rows.setdefault(row[0], []).append(row)
+        rows = []
+        for family in sorted(self.family_rows, key=collation_key):
+            rows.extend(row for row in self.family_rows[family] if totals or row[1] != "Total")
+        return rows
@@ -0,0 +1,308 @@
+# The figures of the plotting scripts (plot_months.py, plot_families.py and plot_top_families.py).
+#
+# Every function builds one figure from the loaded csv file (see loader.py) and returns it,
+# the scripts show the figures and render_plots.py saves them into png files (see render.py).
+# The timelines can also come from the rollup cube at another resolution than months (see cube.py).
+# With many families, the heatmap (plot_family_heatmap) shows all of them at once as dense family x month images.
+
+import matplotlib.colors as mc
+import matplotlib.dates as md
+import matplotlib.pyplot as plt
+import matplotlib.ticker as mt
+import matplotlib.transforms as mtransforms
+import numpy as np
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+
+
+dateformat = "%Y-%m"
+datelocator_interval = 3  # A tick every 3 months
+figure_size = (22, 12)
+
+# Splitting the families into groups based on the largest monthly payment sum in USD
+# Thresholds $1000 and $50000, respectively
+SMALL_THRESHOLD = 1000
+MEDIUM_THRESHOLD = 50000
+FAMILY_GROUPS = ("small", "medium", "large")
+
+
+def _finish(fig):
+    fig.autofmt_xdate(rotation=25)
+    fig.set_size_inches(*figure_size, forward=True)
+    fig.tight_layout()
+    return fig
+
+
+def plot_months(timeline, scale="linear", usd_factor=1000000, resolution="month"):
+    # Expects a MonthTimeline (or a CubeMonthTimeline at the resolution, see cube.py), the USD timeline is shown in million USD by default
+    formatter = mt.ScalarFormatter()
+    formatter.set_scientific(False)
+
+    months = timeline.month
+    count = timeline.count
+    amount_btc = np.round(timeline.sum_btc, 4)
+    amount_usd = np.round(timeline.sum_usd / usd_factor, 2)
+
+    fig, axes = plt.subplots(3)
+
+    titles = ["Number of transactions", "Payment sum in BTC", "Payment sum in USD (in millions)"]
+    stats = [count, amount_btc, amount_usd]
+    colours = ["blue", "green", "red"]
+    epsilons = [75, 300, 1.6]
+
+    for i in range(len(stats)):
+        ax = axes[i]
+        y_values = stats[i]
+
+        ax.xaxis.set_major_formatter(md.DateFormatter(dateformat))
+        ax.xaxis.set_major_locator(md.MonthLocator(interval=datelocator_interval))
+        ax.set_xlim(months[0], months[-1])
+
+        ax.yaxis.set_major_formatter(formatter)
+        ax.tick_params(axis='y', labelrotation=25)
+        ax.set_yscale(scale)
+
+        # Add value labels for peaks
+        epsilon = epsilons[i]
+        for j in range(1, len(y_values) - 1):
+            if y_values[j] > (y_values[j-1] + epsilon) and y_values[j] > (y_values[j+1] + epsilon):
+                ax.text(months[j], y_values[j], y_values[j], ha="center", va="bottom", fontfamily="monospace", fontsize=14)
+        ax.text(months[0], y_values[0], y_values[0], ha="left", va="bottom", fontfamily="monospace", fontsize=14)
+        ax.text(months[-1], y_values[-1], y_values[-1], ha="right", va="bottom", fontfamily="monospace", fontsize=14)
+
+        # Increase font (credits to https://stackoverflow.com/questions/3899980/how-to-change-the-font-size-on-a-matplotlib-plot)
+        for item in (ax.get_xticklabels() + ax.get_yticklabels()):
+            item.set_fontsize(14)
+
+        # Credits to: https://stackoverflow.com/questions/46735745/how-to-control-scientific-notation-in-matplotlib
+        ax.get_yaxis().set_major_formatter(mt.FuncFormatter(lambda x, p: format(int(x), ',')))
+
+        ax.plot(months, y_values, color=colours[i], marker='o')
+        ax.set_title(titles[i], fontsize=18)
+        ax.grid()
+
+    first_month = months[0].item().strftime("%B %Y")
+    last_month = months[-1].item().strftime("%B %Y")
+    fig.suptitle(f"Timeline of ransom transactions per {resolution} in the period from {first_month} until {last_month}", fontsize=20)
+    return _finish(fig)
+
+
+def split_family_groups(timeline):
+    # Returns {"small": [...], "medium": [...], "large": [...]} based on the largest monthly payment sum in USD
+    groups = {group_name: [] for group_name in FAMILY_GROUPS}
+    for family, max_sum_usd in zip(timeline.families, timeline.maxima("sum_usd")):
+        if max_sum_usd < SMALL_THRESHOLD:
+            groups["small"].append(family)
+        elif max_sum_usd < MEDIUM_THRESHOLD:
+            groups["medium"].append(family)
+        else:
+            groups["large"].append(family)
+    return groups
+
+
+def family_colours(timeline, seed=None):
+    # A random colour for every family (the same seed gives the same colours, e.g. for figures rendered in parallel)
+    if seed is None:
+        return {family: np.random.rand(3,) for family in timeline.families}
+    rng = np.random.default_rng(seed)
+    return {family: rng.random(3) for family in timeline.families}
+
+
+def _family_collections(ax, timeline, family_names, metric, colours, marker_size=6):
+    # Draws the series of all families as one LineCollection and one marker collection (instead of a Line2D per family),
+    # so that the time to draw does not grow with the number of artists. Returns the proxy artists for the legend.
+    segments = []
+    segment_colours = []
+    points = []
+    point_colours = []
+    for family_name in family_names:
+        month = md.date2num(timeline.series(family_name, "month"))
+        stats = timeline.series(family_name, metric)
+        colour = colours[family_name]
+        segments.append(np.column_stack((month, stats)))
+        segment_colours.append(colour)
+        point_colours.append(np.broadcast_to(colour, (len(month), len(colour))))
+        points.append(segments[-1])
+
+    proxies = [Line2D([], [], color=colours[family_name], marker='o', label=family_name) for family_name in family_names]
+    if not family_names:
+        return proxies
+    ax.add_collection(LineCollection(segments, colors=segment_colours))
+    points = np.concatenate(points)
+    # Without edges (drawing the edge of every marker doubles the time), the edge of the markers of `ax.plot` is added to the size
+    ax.scatter(points[:, 0], points[:, 1], c=np.concatenate(point_colours), s=(marker_size + 1) ** 2, marker='o', linewidths=0, zorder=3)
+    ax.autoscale_view()
+    return proxies
+
+
+def plot_family_group(timeline, family_names, group_name, colours, num_cols_legend=5):
+    # Expects a FamilyTimeline, the names of the families in the group and the colour of every family
+    fig, axes = plt.subplots(3)
+    fig.suptitle(f"Timeline of transactions of different ransomware families ({group_name})", fontsize=20)
+
+    formatter = mt.ScalarFormatter()
+    formatter.set_scientific(False)
+
+    metrics = ["count", "sum_btc", "sum_usd"]
+    titles = ["Number of transactions", "Payment sum in BTC", "Payment sum in USD"]
+
+    for i, metric in enumerate(metrics):
+        ax = axes[i]
+        title = titles[i]
+
+        proxies = _family_collections(ax, timeline, family_names, metric, colours)
+
+        ax.set_title(title, fontsize=18)
+        ax.xaxis_date()
+        ax.xaxis.set_major_formatter(md.DateFormatter(dateformat))
+        ax.xaxis.set_major_locator(md.MonthLocator(interval=datelocator_interval))
+        ax.yaxis.set_major_formatter(formatter)
+        ax.tick_params(labelrotation=25)
+        ax.legend(handles=proxies, ncol=num_cols_legend, fontsize="small")
+        ax.grid()
+        for item in (ax.get_xticklabels() + ax.get_yticklabels()):
+            item.set_fontsize(14)
+        if metric != "sum_btc" or group_name == "large":  # Skip btc for small and medium, since they have small y-scale
+            ax.get_yaxis().set_major_formatter(mt.FuncFormatter(lambda x, p: format(int(x), ',')))
+        ax.tick_params(axis='y', labelrotation=25)
+
+    return _finish(fig)
+
+
+# The orders of the families in the heatmap
+FAMILY_ORDERS = ("total", "first", "cluster")
+HEATMAP_COLOURMAP = "viridis"
+MAX_FAMILY_LABELS = 200  # With more families, the rows of the heatmap are not labelled
+
+
+def order_families(timeline, matrix, order="total"):
+    # Returns the rows of `matrix` (a dense family x month matrix, see FamilyTimeline.matrix) in the order:
+    # - "total": by the total of the matrix (descending)
+    # - "first": by the first month with transactions, then by the total
+    # - "cluster": families with similar timelines next to each other (a greedy nearest neighbour chain on the
+    #   cosine similarity of the log-scaled rows, starting with the largest family)
+    totals = matrix.sum(axis=1)
+    by_total = np.argsort(-totals, kind="stable")
+    if order == "total":
+        return by_total
+    if order == "first":
+        if len(by_total) == 0:
+            return by_total
+        first = np.minimum.reduceat(timeline.month, timeline.offsets[:-1])
+        return by_total[np.argsort(first[by_total], kind="stable")]
+    if order == "cluster":
+        rows = np.log1p(np.maximum(matrix, 0).astype(np.float64))
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        rows = np.divide(rows, norms, out=np.zeros_like(rows), where=norms > 0)
+        similarity = rows @ rows.T
+        visited = np.zeros(len(rows), dtype=bool)
+        chain = [by_total[0]] if len(rows) > 0 else []
+        visited[chain] = True
+        for _ in range(len(rows) - 1):
+            candidates = np.where(visited, -np.inf, similarity[chain[-1]])
+            chain.append(int(np.argmax(candidates)))  # The first of equally similar families (the order of the csv file)
+            visited[chain[-1]] = True
+        return np.asarray(chain, dtype=np.int64)
+    raise ValueError(f"Unknown order {order}")
+
+
+def plot_family_heatmap(timeline, order="total", order_metric="sum_usd", colourmap=HEATMAP_COLOURMAP):
+    # Expects a FamilyTimeline, draws every metric as one image (a row per family, a column per month) with log colours,
+    # so that the time to draw hardly depends on the number of families. The rows are the same in all three images.
+    buckets = timeline.buckets()
+    metrics = ["count", "sum_btc", "sum_usd"]
+    titles = ["Number of transactions", "Payment sum in BTC", "Payment sum in USD"]
+    matrices = {metric: timeline.matrix(metric, buckets) for metric in metrics}
+    rows = order_families(timeline, matrices[order_metric], order)
+    family_names = [timeline.families[i] for i in rows]
+    labelled = 0 < len(family_names) <= MAX_FAMILY_LABELS
+    font_size = min(10, 500 / max(len(family_names), 1))  # As large as the rows allow
+
+    # No tight_layout (it draws all the labels once more), the left margin is estimated from the longest family name
+    fig, axes = plt.subplots(1, 3)
+    fig.set_size_inches(*figure_size, forward=True)
+    label_width = max(map(len, family_names)) * 0.6 * font_size / 72 / figure_size[0] if labelled else 0.02
+    fig.subplots_adjust(left=0.02 + label_width, right=0.99, top=0.9, bottom=0.05, wspace=0.08)
+    fig.suptitle(f"Timeline of transactions of all {len(family_names)} ransomware families (ordered by {order})", fontsize=20)
+
+    labels = [str(bucket) for bucket in buckets]
+    cmap = plt.get_cmap(colourmap).with_extremes(bad="white")  # The months without transactions are white
+    for i, metric in enumerate(metrics):
+        ax = axes[i]
+        values = np.ma.masked_less_equal(matrices[metric][rows], 0)
+        norm = mc.LogNorm(vmin=values.min(), vmax=values.max()) if values.count() > 0 else None
+        image = ax.imshow(values, aspect="auto", interpolation="nearest", cmap=cmap, norm=norm)
+        colourbar = fig.colorbar(image, ax=ax, orientation="horizontal", pad=0.08, fraction=0.04)
+        # Plain labels of the powers of ten (mathtext, the default, is slow to lay out) and no minor ticks
+        colourbar.ax.xaxis.set_major_formatter(mt.LogFormatter())
+        colourbar.ax.minorticks_off()
+
+        ax.set_title(titles[i], fontsize=18)
+        # The columns are the positions in `buckets`, the ticks are labelled with the months
+        ax.xaxis.set_major_locator(mt.MaxNLocator(8, integer=True))
+        ax.xaxis.set_major_formatter(mt.FuncFormatter(lambda x, p: labels[int(x)] if 0 <= x < len(labels) else ""))
+        ax.tick_params(axis='x', labelrotation=25, labelsize=12)
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment("right")
+        ax.set_yticks([])
+
+    if labelled:
+        # A text per row is cheaper than a tick per row (every tick also has its lines)
+        transform = mtransforms.blended_transform_factory(axes[0].transAxes, axes[0].transData)
+        for j, family_name in enumerate(family_names):
+            axes[0].text(-0.005, j, family_name, transform=transform, ha="right", va="center", fontsize=font_size)
+    else:
+        axes[0].set_ylabel(f"{len(family_names)} families (ordered by {order})", fontsize=14)
+    return fig
+
+
+# For colours see: https://matplotlib.org/stable/gallery/color/named_colors.html
+TOP_COLOURS = ["red", "darkcyan", "black", "darkorange", "dodgerblue", "magenta", "gold", "limegreen", "blueviolet", "chocolate", "olivedrab", "lawngreen", "darkgreen", "lightseagreen", "silver", "blue", "olive", "violet", "tan", "darkred", "hotpink", "khaki", "dimgrey", "salmon", "sandybrown"]
+
+
+def top_families(timeline, metric, topN):
+    # The top N families by the total of `metric` (a stable sort, so that families with equal totals keep the order of the csv file)
+    families = np.array(timeline.families, dtype=object)
+    return list(families[np.argsort(-timeline.totals(metric), kind="stable")][:topN])
+
+
+def plot_top_families(timeline, topN=15, scale="linear", num_cols_legend=5, font_size_legend="medium"):
+    # Expects a FamilyTimeline (the USD sums can be scaled beforehand, e.g. `timeline.sum_usd /= 1000000`)
+    min_month = timeline.month.min()
+    max_month = timeline.month.max()
+
+    fig, axes = plt.subplots(3)
+
+    metrics = ["count", "sum_btc", "sum_usd"]
+    titles = [f"Top {topN} families in the number of transactions", f"Top {topN} families in the payment sum in BTC", f"Top {topN} families in the payment sum in USD"]
+    family_groups = [top_families(timeline, metric, topN) for metric in metrics]
+
+    for i, family_names in enumerate(family_groups):
+        ax = axes[i]
+        metric = metrics[i]
+        title = titles[i]
+
+        for j, family_name in enumerate(family_names):
+            ax.plot(timeline.series(family_name, "month"), timeline.series(family_name, metric), color=TOP_COLOURS[j], marker='o', markersize=7, label=family_name, alpha=0.7)
+
+        ax.xaxis.set_major_formatter(md.DateFormatter(dateformat))
+        ax.xaxis.set_major_locator(md.MonthLocator(interval=datelocator_interval))
+        ax.tick_params(labelrotation=25)
+        ax.set_xlim(min_month, max_month + np.timedelta64(10, "D"))
+        ax.set_yscale(scale)
+
+        # Increase font (credits to https://stackoverflow.com/questions/3899980/how-to-change-the-font-size-on-a-matplotlib-plot)
+        for item in (ax.get_xticklabels() + ax.get_yticklabels()):
+            item.set_fontsize(14)
+
+        # Credits to: https://stackoverflow.com/questions/46735745/how-to-control-scientific-notation-in-matplotlib
+        ax.get_yaxis().set_major_formatter(mt.FuncFormatter(lambda x, p: format(int(x), ',')))
+
+        ax.set_title(title, fontsize=18)
+        ax.legend(ncol=num_cols_legend, fontsize=font_size_legend)
+        ax.grid()
+
+    first_month = min_month.item().strftime("%B %Y")
+    last_month = max_month.item().strftime("%B %Y")
+    fig.suptitle(f"Timeline of the top {topN} ransomware families from {first_month} until {last_month}", fontsize=20)
+    return _finish(fig)
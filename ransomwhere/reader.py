@@ -0,0 +1,232 @@
+# Reading the JSON file from the Ransomwhere website (https://api.ransomwhe.re/export).
+# To download the file you can run: curl -sL "https://api.ransomwhe.re/export" | jq --indent 0 '.result' > data.json
+#
+# Each record in the top-level array describes one address:
+# {"address": ..., "family": ..., "createdAt": ..., "updatedAt": ..., "transactions": [{"hash": ..., "time": ..., "amount": ..., "amountUSD": ...}, ...]}
+#
+# The records are independent, so the array can also be split into byte ranges at record boundaries (record_ranges)
+# that are parsed separately (iter_range), e.g. by several processes (see chunks.py).
+#
+# The file can also be compressed with gzip, bzip2 or xz (e.g. archived exports), it is then decompressed as a stream
+# while it is parsed (see open_export), without an uncompressed copy on the disk. The format is detected from the first
+# bytes of the file, not from its name. The hashes of the caches are computed from the compressed file.
+
+import bz2
+import codecs
+import gzip
+import hashlib
+import json
+import lzma
+import os
+
+
+# The file is read in chunks of this size (in characters)
+CHUNK_SIZE = 1 << 16
+HASH_BLOCK_SIZE = 1 << 20
+# The window read around the nominal offsets of the ranges when looking for the next record (in bytes)
+BOUNDARY_WINDOW = 1 << 16
+BOUNDARY_LOOKBACK = 64  # For the "," before a record (a record after more whitespace is skipped, the next one is taken)
+
+# The magic bytes of the supported compression formats -> the function opening such a file
+COMPRESSIONS = {
+    b"\x1f\x8b": gzip.open,
+    b"BZh": bz2.open,
+    b"\xfd7zXZ\x00": lzma.open,
+}
+
+
+def file_hash(path):
+    # Hash of the contents of the file, the caches built from the file are keyed by it (see cache.py and database.py)
+    digest = hashlib.blake2b()
+    with open(path, "rb") as file:
+        while block := file.read(HASH_BLOCK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stat(path):
+    # The file is only hashed again when its size or modification time differ
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def compression_opener(path):
+    # Returns the function opening the compressed file (e.g. gzip.open), None for an uncompressed file
+    with open(path, "rb") as file:
+        head = file.read(max(len(magic) for magic in COMPRESSIONS))
+    for magic, opener in COMPRESSIONS.items():
+        if head.startswith(magic):
+            return opener
+    return None
+
+
+def open_export(path):
+    # Opens the JSON file (data.json, data.json.gz, ...) for reading as text, compressed files are decompressed on the fly
+    opener = compression_opener(path)
+    if opener is None:
+        return open(path, "r")
+    return opener(path, "rt")
+
+
+def load_records(path):
+    # Expects the full JSON file (data.json), returns the list of address records
+    # Note: the whole file is kept in memory, use `iter_records` for large files
+    with open_export(path) as file:
+        return json.load(file)
+
+
+def iter_records(path, chunk_size=CHUNK_SIZE):
+    # Expects the full JSON file (data.json), yields the address records one by one
+    # Only the current record (and one chunk of the file) is kept in memory, unlike `jq '.[]'` or `json.load`
+    with open_export(path) as file:
+        yield from _iter_array(file, chunk_size)
+
+
+def iter_range(path, start, end, chunk_size=CHUNK_SIZE):
+    # Yields the address records in the bytes [start, end) of the JSON file, see record_ranges
+    with open(path, "rb") as file:
+        yield from _iter_array(_RangeReader(file, start, end), chunk_size, inside=True)
+
+
+class _RangeReader:
+    # Reads the bytes [start, end) of a binary file as text (like a file opened with "r")
+
+    def __init__(self, file, start, end):
+        self.file = file
+        self.remaining = end - start
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        file.seek(start)
+
+    def read(self, size):
+        text = ""
+        while not text and self.remaining > 0:
+            # A character can be split between two reads, the decoder keeps its first bytes
+            data = self.file.read(min(size, self.remaining))
+            self.remaining = self.remaining - len(data) if data else 0
+            text = self.decoder.decode(data, final=self.remaining == 0)
+        return text
+
+
+def _record_at(file, offset):
+    # Returns True if an address record starts at the offset ("{" after "[" or "," of the top-level array)
+    try:
+        record = next(_iter_array(_RangeReader(file, offset, os.fstat(file.fileno()).st_size), CHUNK_SIZE, inside=True))
+    except (ValueError, StopIteration):
+        return False
+    # The objects of the transactions are nested in the records, they do not have these keys
+    return isinstance(record, dict) and "address" in record and "transactions" in record
+
+
+def _next_record(file, offset, size):
+    # The offset of the first record starting at or after `offset`, None if there is none
+    # Candidates are "{" preceded by "," (and whitespace), each one is checked by decoding the object there
+    while offset < size:
+        base = max(offset - BOUNDARY_LOOKBACK, 0)
+        file.seek(base)
+        window = file.read(offset - base + BOUNDARY_WINDOW)
+        pos = window.find(b"{", offset - base)
+        while pos != -1:
+            before = pos - 1
+            while before >= 0 and window[before] in b" \t\r\n":
+                before -= 1
+            if before >= 0 and window[before] == ord(",") and _record_at(file, base + pos):
+                return base + pos
+            pos = window.find(b"{", pos + 1)
+        offset = base + len(window)
+    return None
+
+
+def _first_record(file):
+    # The offset of the first record of the top-level array, None for an empty array
+    window = file.read(BOUNDARY_WINDOW)
+    pos = len(window) - len(window.lstrip())
+    if window[pos:pos + 1] != b"[":
+        raise ValueError("Expected a JSON array at the top level")
+    pos += 1
+    pos += len(window[pos:]) - len(window[pos:].lstrip())
+    return None if window[pos:pos + 1] == b"]" else pos
+
+
+def record_ranges(path, num_ranges):
+    # Splits the top-level array into at most `num_ranges` byte ranges [(start, end), ...] of roughly the same size,
+    # every range starts at a record and contains whole records (the last one also the closing "]")
+    # Only for uncompressed files (a compressed stream cannot be read from an offset)
+    size = os.path.getsize(path)
+    with open(path, "rb") as file:
+        first = _first_record(file)
+        if first is None:
+            return []
+        starts = [first]
+        for i in range(1, num_ranges):
+            # A large record can span several nominal offsets, the ranges are then merged
+            start = _next_record(file, max(size * i // num_ranges, starts[-1] + 1), size)
+            if start is None:
+                break
+            starts.append(start)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _iter_array(file, chunk_size, inside=False):
+    # With `inside`, the file is a range of records inside the top-level array (see iter_range), it may end after any record
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    read_size = chunk_size
+    expect_record = True  # A record is expected after "[" and after ","
+    after_comma = False
+    started = inside
+
+    while True:
+        # Skip the whitespace (and read more if the buffer has been consumed)
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos == len(buffer):
+            buffer = file.read(read_size)
+            pos = 0
+            if not buffer:
+                if inside:
+                    return
+                raise ValueError("Unexpected end of the file, the top-level array is not closed")
+            continue
+
+        char = buffer[pos]
+        if not started:
+            if char != "[":
+                raise ValueError("Expected a JSON array at the top level")
+            started = True
+            pos += 1
+            continue
+        if char == "]":
+            if expect_record and after_comma:
+                raise ValueError("Unexpected ']' after ',' in the top-level array")
+            return
+        if char == ",":
+            if expect_record:
+                raise ValueError("Unexpected ',' in the top-level array")
+            expect_record = True
+            after_comma = True
+            pos += 1
+            continue
+        if not expect_record:
+            raise ValueError(f"Expected ',' or ']' in the top-level array, got {char!r}")
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # The record is (most likely) incomplete, read more and try again
+            more = file.read(read_size)
+            if not more:
+                raise
+            buffer = buffer[pos:] + more
+            pos = 0
+            read_size *= 2  # Avoid decoding a large record over and over again
+            continue
+
+        yield record
+        expect_record = False
+        pos = end
+        read_size = chunk_size
+        if pos >= chunk_size:
+            # Drop the records that have been consumed
+            buffer = buffer[pos:]
+            pos = 0
@@ -0,0 +1,205 @@
+# Headless batch rendering of all figures into png files.
+#
+# The figures are independent of each other, so they are rendered in parallel by a pool of processes.
+# Every worker uses the Agg backend (no windows) and reports the wall time of its figure.
+#
+# Figures:
+# - timeline_months (from timeline_months.csv)
+# - timeline_top_families (from timeline_families.csv)
+# - timeline_families_small, timeline_families_medium, timeline_families_large (from timeline_families.csv)
+# - timeline_families_heatmap (from timeline_families.csv, all families ordered by the total payment sum in USD)
+#
+# Render cache: the png files are also stored in a content-addressed cache (output/.render_cache/<key>.png).
+# The key of a figure is a hash of exactly the data that is drawn and of everything else that changes the image:
+# - The rows of the csv files in the figure (e.g. only the families of the group, or only the top families of every
+#   metric, together with their colours), so a refresh that does not touch them does not change the key
+# - The parameters (resolution of the png file, seed of the colours, excluded families, top N)
+# - The source code of the plots (the thresholds of the groups, the date locator, the size of the figure, ...)
+#   and the version of matplotlib
+# Figures with a key in the cache are copied from the cache, only the other figures are rendered.
+# The cache keeps only the last key of every figure (listed in figures.json), the older png files are removed after
+# every run, so the cache does not grow with every refresh.
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+
+FIGURES = (
+    "timeline_months",
+    "timeline_top_families",
+    "timeline_families_small",
+    "timeline_families_medium",
+    "timeline_families_large",
+    "timeline_families_heatmap",
+)
+
+# The families excluded from the top families plot (see plot_top_families.py)
+TOP_FAMILIES_EXCLUDE = ("BlackCat",)
+TOP_FAMILIES_TOPN = 15
+
+RENDER_CACHE_VERSION = 1
+RENDER_CACHE_DIR = ".render_cache"  # In the output directory
+RENDER_CACHE_INDEX = "figures.json"  # The last key of every figure
+
+# The code that draws the figures, a change of any of these files invalidates all figures
+_SOURCE_FILES = ("plots.py", "loader.py", "render.py")
+
+
+def _build_figure(name, months_csv, families_csv, seed):
+    # Imported here, so that the Agg backend is selected before pyplot is imported in the worker
+    from ransomwhere import plots
+    from ransomwhere.loader import FamilyTimeline, MonthTimeline
+
+    if name == "timeline_months":
+        return plots.plot_months(MonthTimeline(months_csv))
+    if name == "timeline_top_families":
+        return plots.plot_top_families(FamilyTimeline(families_csv, exclude=TOP_FAMILIES_EXCLUDE), topN=TOP_FAMILIES_TOPN)
+    if name == "timeline_families_heatmap":
+        return plots.plot_family_heatmap(FamilyTimeline(families_csv))
+    if name.startswith("timeline_families_"):
+        group_name = name[len("timeline_families_"):]
+        timeline = FamilyTimeline(families_csv)
+        groups = plots.split_family_groups(timeline)
+        return plots.plot_family_group(timeline, groups[group_name], group_name, plots.family_colours(timeline, seed))
+    raise ValueError(f"Unknown figure {name}")
+
+
+def render_figure(name, months_csv, families_csv, output_dir, dpi=100, seed=0):
+    # Renders one figure into output_dir/name.png, returns the path and the wall time in seconds
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    start = time.perf_counter()
+    fig = _build_figure(name, months_csv, families_csv, seed)
+    path = os.path.join(output_dir, f"{name}.png")
+    fig.savefig(path, dpi=dpi)
+    plt.close(fig)
+    return path, time.perf_counter() - start
+
+
+def _hash_series(digest, timeline, family_names, columns):
+    # The rows of the families (in the given order) as they are drawn
+    for family_name in family_names:
+        digest.update(json.dumps(family_name).encode("utf-8"))
+        for column in columns:
+            digest.update(timeline.series(family_name, column).tobytes())
+
+
+def figure_keys(months_csv, families_csv, figures=FIGURES, dpi=100, seed=0):
+    # Returns the key of every figure in the render cache (see above)
+    import matplotlib
+    matplotlib.use("Agg")
+    import numpy as np
+    from ransomwhere import plots
+    from ransomwhere.loader import FamilyTimeline, MonthTimeline
+
+    common = hashlib.blake2b()
+    common.update(json.dumps([RENDER_CACHE_VERSION, matplotlib.__version__, dpi]).encode("utf-8"))
+    for file_name in _SOURCE_FILES:
+        with open(os.path.join(os.path.dirname(__file__), file_name), "rb") as file:
+            common.update(file.read())
+
+    # Loaded at most once (the csv files are small compared to rendering)
+    timelines = dict()
+
+    def families(exclude=()):
+        if exclude not in timelines:
+            timelines[exclude] = FamilyTimeline(families_csv, exclude=exclude)
+        return timelines[exclude]
+
+    keys = dict()
+    for name in figures:
+        digest = common.copy()
+        digest.update(name.encode("utf-8"))
+        if name == "timeline_months":
+            timeline = MonthTimeline(months_csv)
+            for column in (timeline.month, timeline.count, timeline.sum_btc, timeline.sum_usd):
+                digest.update(column.tobytes())
+        elif name == "timeline_top_families":
+            timeline = families(TOP_FAMILIES_EXCLUDE)
+            digest.update(json.dumps([TOP_FAMILIES_EXCLUDE, TOP_FAMILIES_TOPN]).encode("utf-8"))
+            if len(timeline.month) > 0:
+                digest.update(np.array([timeline.month.min(), timeline.month.max()]).tobytes())  # The limits of the x axis
+            for metric in ("count", "sum_btc", "sum_usd"):
+                _hash_series(digest, timeline, plots.top_families(timeline, metric, TOP_FAMILIES_TOPN), ("month", metric))
+        elif name == "timeline_families_heatmap":
+            timeline = families()
+            _hash_series(digest, timeline, timeline.families, ("month", "count", "sum_btc", "sum_usd"))
+        elif name.startswith("timeline_families_"):
+            timeline = families()
+            group = plots.split_family_groups(timeline)[name[len("timeline_families_"):]]
+            colours = plots.family_colours(timeline, seed)  # Depend on the position of the family among all families
+            _hash_series(digest, timeline, group, ("month", "count", "sum_btc", "sum_usd"))
+            for family_name in group:
+                digest.update(np.asarray(colours[family_name]).tobytes())
+        else:
+            raise ValueError(f"Unknown figure {name}")
+        keys[name] = digest.hexdigest()
+    return keys
+
+
+def _store(path, cache_path):
+    # The temporary file is renamed, so the cache never holds a partly written png file
+    tmp_path = f"{cache_path}.tmp"
+    shutil.copyfile(path, tmp_path)
+    os.replace(tmp_path, cache_path)
+
+
+def _prune(cache_dir, keys):
+    # Records the keys of the figures of this run and removes the png files of all other keys
+    # (the figures that have not been rendered in this run keep their last entry)
+    index_path = os.path.join(cache_dir, RENDER_CACHE_INDEX)
+    try:
+        with open(index_path, "r") as file:
+            index = json.load(file)
+    except (OSError, ValueError):
+        index = dict()
+    index = {name: key for name, key in {**index, **keys}.items() if name in FIGURES}
+    tmp_path = f"{index_path}.tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(index, file)
+    os.replace(tmp_path, index_path)
+
+    current = {f"{key}.png" for key in index.values()}
+    for file_name in os.listdir(cache_dir):
+        if file_name.endswith(".png") and file_name not in current:
+            os.remove(os.path.join(cache_dir, file_name))
+
+
+def render_all(months_csv, families_csv, output_dir, figures=FIGURES, workers=None, dpi=100, seed=0, cache_dir=None, use_cache=True):
+    # Renders the figures in parallel, yields (name, path, wall time, cached) in the order of `figures`
+    # With `use_cache`, the figures with the same key as before are copied from the render cache (cached is True)
+    os.makedirs(output_dir, exist_ok=True)
+    keys = dict()
+    cached = set()
+    if use_cache:
+        if cache_dir is None:
+            cache_dir = os.path.join(output_dir, RENDER_CACHE_DIR)
+        os.makedirs(cache_dir, exist_ok=True)
+        keys = figure_keys(months_csv, families_csv, figures, dpi, seed)
+        cached = {name for name in figures if os.path.isfile(os.path.join(cache_dir, f"{keys[name]}.png"))}
+
+    # Imported here, multiprocessing is slow to import (e.g. for `python -m ransomwhere --help`, see cli.py)
+    from concurrent.futures import ProcessPoolExecutor
+
+    rendered = [name for name in figures if name not in cached]
+    workers = workers or max(min(len(rendered), os.cpu_count() or 1), 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(render_figure, name, months_csv, families_csv, output_dir, dpi, seed) for name in rendered}
+        for name in figures:
+            if name in cached:
+                start = time.perf_counter()
+                path = os.path.join(output_dir, f"{name}.png")
+                shutil.copyfile(os.path.join(cache_dir, f"{keys[name]}.png"), path)
+                yield name, path, time.perf_counter() - start, True
+                continue
+            path, elapsed = futures[name].result()
+            if use_cache:
+                _store(path, os.path.join(cache_dir, f"{keys[name]}.png"))
+            yield name, path, elapsed, False
+    if use_cache:
+        _prune(cache_dir, keys)
@@ -0,0 +1,156 @@
+# Output of the computed statistics: csv files and colourful terminal output (the same as in run_stats.sh).
+
+from ransomwhere.engine import collation_key, format_time
+
+
+TIMELINE_YEARS_HEADER = "Year,Count,Sum (BTC),Sum (USD),Average (BTC),Average (USD)"
+TIMELINE_MONTHS_HEADER = "Month,Count,Sum (BTC),Sum (USD),Average (BTC),Average (USD)"
+TIMELINE_FAMILIES_HEADER = "Family,Month,Count,Sum (BTC),Sum (USD),Used Addresses,Known Addresses"
+
+TIMELINE_FORMAT = "%s,%d,%f,%.2f,%f,%.2f"
+TIMELINE_FAMILIES_FORMAT = "%s,%s,%d,%f,%.2f,%d,%d"
+
+# The quantiles of the ransom sizes (run_stats.py --quantiles), one csv file per year, month and family
+QUANTILES_COLUMNS = "Count,Median (BTC),P90 (BTC),P99 (BTC),Max (BTC),Median (USD),P90 (USD),P99 (USD),Max (USD)"
+QUANTILES_YEARS_HEADER = f"Year,{QUANTILES_COLUMNS}"
+QUANTILES_MONTHS_HEADER = f"Month,{QUANTILES_COLUMNS}"
+QUANTILES_FAMILIES_HEADER = f"Family,{QUANTILES_COLUMNS}"
+
+QUANTILES_FORMAT = "%s,%d,%f,%f,%f,%f,%.2f,%.2f,%.2f,%.2f"
+
+
+def print_title(text):
+    print(f"\033[1;91m{text}\033[0m")
+
+
+def print_result(text):
+    print(f"\033[1;96m{text}\033[0m")
+
+
+def print_misc(text):
+    print(f"\033[1;93m{text}\033[0m")
+
+
+def print_welcome(name):
+    print(f"\033[1;92mWelcome to {name}! How about this? \033[0m")
+
+
+def print_goodbye():
+    print("\033[1;95mThis script has been sponsored by Smaragdakis et al.!\033[0m")
+    print("\033[1;95mHave a nice day!\033[0m")
+
+
+def format_csv(header, fmt, rows):
+    # Returns the contents of the csv file, the same as `echo -e "$timeline" > timeline.csv`
+    lines = [header]
+    lines.extend(fmt % row for row in rows)
+    return "\n".join(lines) + "\n"
+
+
+def format_table(csv_text):
+    # The same as `tr ',' '\t' | column -t -s $'\t'`
+    rows = [line.split(",") for line in csv_text.splitlines() if line]
+    if not rows:
+        return ""
+    widths = [0] * max(len(row) for row in rows)
+    for row in rows:
+        for i, cell in enumerate(row):
+            widths[i] = max(widths[i], len(cell))
+    lines = []
+    for row in rows:
+        cells = [cell.ljust(widths[i]) for i, cell in enumerate(row[:-1])] + [row[-1]]
+        lines.append("  ".join(cells))
+    return "\n".join(lines)
+
+
+def timeline_years_csv(engine):
+    return format_csv(TIMELINE_YEARS_HEADER, TIMELINE_FORMAT, engine.timeline_years())
+
+
+def timeline_months_csv(engine):
+    return format_csv(TIMELINE_MONTHS_HEADER, TIMELINE_FORMAT, engine.timeline_months())
+
+
+def timeline_families_csv(engine, totals=False):
+    return format_csv(TIMELINE_FAMILIES_HEADER, TIMELINE_FAMILIES_FORMAT, engine.timeline_families(totals=totals))
+
+
+def quantiles_years_csv(engine):
+    return format_csv(QUANTILES_YEARS_HEADER, QUANTILES_FORMAT, engine.quantiles_years())
+
+
+def quantiles_months_csv(engine):
+    return format_csv(QUANTILES_MONTHS_HEADER, QUANTILES_FORMAT, engine.quantiles_months())
+
+
+def quantiles_families_csv(engine):
+    return format_csv(QUANTILES_FAMILIES_HEADER, QUANTILES_FORMAT, engine.quantiles_families())
+
+
+def print_general_stats(engine):
+    stats = engine.general_stats()
+
+    print_title("Total number of transactions")
+    print_result("%d" % stats.num_transactions)
+
+    print_title("Total payment sum (BTC)")
+    print_result("%f" % stats.total_btc)
+
+    print_title("Total payment sum (USD)")
+    print_result("%.2f" % stats.total_usd)
+
+    print_title("Means for ransom sizes (BTC, USD)")
+    if stats.mean_btc is not None:
+        print_result("Mean (BTC): %f, Mean (USD): %.2f" % (stats.mean_btc, stats.mean_usd))
+
+    print_title("Time range of transactions")
+    if stats.first_time is not None:
+        first = format_time(stats.first_time, "%Y-%m-%d %H:%M:%S")
+        last = format_time(stats.last_time, "%Y-%m-%d %H:%M:%S")
+        print_result(f"First transaction: {first}\nLast transaction: {last}")
+
+    print_title("Total number of families")
+    print_result(stats.num_families)
+    print_title("Total number of non-empty families")
+    print_result(stats.num_non_empty_families)
+    print_title("Total number of empty families")
+    print_result(stats.num_empty_families)
+
+    print_title("Total number of addresses")
+    print_result(stats.num_addresses)
+    print_title("Number of empty addresses (and the corresponding families)")
+    print_result(stats.num_empty_addresses)
+
+    # The same as `sort | uniq -c | sort -rn`: by count (descending), then by family (descending)
+    counts = sorted(stats.empty_address_counts.items(), key=lambda item: collation_key(item[0]), reverse=True)
+    counts.sort(key=lambda item: item[1], reverse=True)
+    one_line = ", ".join(f"{family}: {count}" for family, count in counts)
+    print_misc(f"{one_line} ({len(counts)} families in total)")
+
+
+def print_quantiles(engine):
+    count, *quantiles = engine.quantiles()
+    print_title("Quantiles of ransom sizes (BTC, USD)")
+    if count > 0:
+        print_result("Median (BTC): %f, P90 (BTC): %f, P99 (BTC): %f, Max (BTC): %f\n"
+                     "Median (USD): %.2f, P90 (USD): %.2f, P99 (USD): %.2f, Max (USD): %.2f" % tuple(quantiles))
+
+
+def print_quantiles_years(csv_text):
+    print_title("Quantiles of ransom sizes (years)")
+    print_result(format_table(csv_text))
+
+
+def print_timeline_years(csv_text):
+    print_title("Timeline of transactions (years)")
+    print_result(format_table(csv_text))
+
+
+def print_timeline_months(csv_text):
+    print_title("Timeline of transactions (months)")
+    print_result(format_table(csv_text))
+
+
+def print_timeline_families(csv_text):
+    print_title("Timeline of transactions per family")
+    print_misc(format_table(csv_text))
@@ -0,0 +1,119 @@
+# Dictionary encoding of strings (family names, addresses and months) into dense integer ids.
+#
+# Used by the columnar cache (cache.py) for the tables stored next to the columns and by the streaming engine (engine.py),
+# which keeps the ids of the addresses in its aggregates instead of the strings (the addresses in a PackedStringTable).
+# Only the standard library is used, so the streaming engine works without NumPy.
+
+from array import array
+
+
+class StringTable:
+    # Dictionary encoding of strings: every distinct string gets a dense integer id (in the order of appearance)
+
+    def __init__(self, strings=()):
+        self.strings = list(strings)
+        self.ids = None  # Built on the first lookup, loading the table should be cheap
+
+    def __getstate__(self):
+        # Only the strings are pickled (e.g. the engines sent back by the workers of chunks.py), the ids are rebuilt
+        return {"strings": self.strings, "ids": None}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, i):
+        return self.strings[i]
+
+    def _build_ids(self):
+        if self.ids is None:
+            self.ids = {string: i for i, string in enumerate(self.strings)}
+
+    def get(self, string):
+        # Returns the id of the string, or None if the string is not in the table
+        self._build_ids()
+        return self.ids.get(string)
+
+    def encode(self, string):
+        self._build_ids()
+        i = self.ids.get(string)
+        if i is None:
+            i = self.ids[string] = len(self.strings)
+            self.strings.append(string)
+        return i
+
+
+class PackedStringTable:
+    # Dictionary encoding of many short strings (the addresses) without a Python object per string: the UTF-8 bytes
+    # of all strings are appended to one bytearray, the end of every string is kept in an array and the ids are found
+    # through an open-addressing hash table of ids (linear probing, at most 2/3 full)
+    # Takes ~50 bytes per 34-character address instead of ~140 for a str object and its entry in a dict
+
+    def __init__(self, strings=()):
+        self.data = bytearray()
+        self.ends = array("Q")
+        self._build_slots(8)
+        for string in strings:
+            self.encode(string)
+
+    def __getstate__(self):
+        # The slots depend on the hashes of the process (PYTHONHASHSEED), they are rebuilt after unpickling
+        return {"data": self.data, "ends": self.ends}
+
+    def __setstate__(self, state):
+        self.data = state["data"]
+        self.ends = state["ends"]
+        size = 8
+        while 3 * len(self.ends) > 2 * size:
+            size *= 2
+        self._build_slots(size)
+
+    def __len__(self):
+        return len(self.ends)
+
+    def _bytes(self, i):
+        return self.data[self.ends[i - 1] if i > 0 else 0:self.ends[i]]
+
+    def __getitem__(self, i):
+        return self._bytes(i).decode("utf-8")
+
+    def __iter__(self):
+        for i in range(len(self.ends)):
+            yield self[i]
+
+    def _build_slots(self, size):
+        self.slots = array("i", [-1]) * size
+        self.mask = size - 1
+        start = 0
+        for i, end in enumerate(self.ends):
+            # The strings are distinct, every one goes to the first empty slot
+            slot = hash(bytes(self.data[start:end])) & self.mask
+            while self.slots[slot] >= 0:
+                slot = (slot + 1) & self.mask
+            self.slots[slot] = i
+            start = end
+
+    def _find(self, key):
+        # Returns the slot of the key, or the empty slot where it belongs
+        slot = hash(key) & self.mask
+        while True:
+            i = self.slots[slot]
+            if i < 0 or self._bytes(i) == key:
+                return slot
+            slot = (slot + 1) & self.mask
+
+    def get(self, string):
+        # Returns the id of the string, or None if the string is not in the table
+        i = self.slots[self._find(string.encode("utf-8"))]
+        return i if i >= 0 else None
+
+    def encode(self, string):
+        key = string.encode("utf-8")
+        slot = self._find(key)
+        i = self.slots[slot]
+        if i < 0:
+            i = self.slots[slot] = len(self.ends)
+            self.data += key
+            self.ends.append(len(self.data))
+            if 3 * len(self.ends) > 2 * len(self.slots):
+                self._build_slots(2 * len(self.slots))
+        return i
@@ -0,0 +1,100 @@
+# Generator of synthetic exports in the same JSON schema as the Ransomwhere dataset (https://api.ransomwhe.re/export).
+#
+# The exports are meant for measuring how the scripts scale with the size of the dataset, so they try to look like
+# the real data (see results/stats/general_results.md):
+# - Family sizes are skewed (Zipf-like): a few families have most of the transactions
+# - Timestamps are spread over 2012-2024, with more transactions in the later years
+# - Amounts are log-normal (most ransoms are small, a few are huge), USD follows a rough BTC price curve
+# - Roughly 28% of the addresses have no transactions at all (empty addresses), some families are empty
+# The same seed always gives the same file. The records are written one by one, so the size is only limited by the disk.
+
+import hashlib
+import json
+import math
+
+import numpy as np
+
+from ransomwhere import BITCOIN_FACTOR
+
+
+FIRST_TIME = 1331251200  # 2012-03-09
+LAST_TIME = 1709424000  # 2024-03-03
+EMPTY_ADDRESS_FRACTION = 0.28
+MEAN_TRANSACTIONS_PER_ADDRESS = 2.8
+EMPTY_FAMILY_FRACTION = 0.2
+BASE58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+
+def default_num_families(num_transactions):
+    # 134 families for the ~20k transactions of the real dataset, slowly growing with the size
+    return max(10, int(134 * (num_transactions / 20000) ** 0.25))
+
+
+def btc_price(timestamps):
+    # A rough exponential BTC price curve in USD: ~5 USD in 2012, ~50000 USD in 2024
+    years = (timestamps - FIRST_TIME) / (365.25 * 86400)
+    return 5.0 * np.exp(years * math.log(10000) / 12.0)
+
+
+def _address(rng):
+    length = int(rng.integers(26, 35))
+    return "1" + "".join(BASE58[i] for i in rng.integers(0, len(BASE58), length - 1))
+
+
+def _iso(timestamp):
+    return np.datetime_as_string(np.datetime64(int(timestamp), "s"), unit="ms") + "Z"
+
+
+def generate_records(num_transactions, seed=0, num_families=None):
+    # Yields address records with (in total) exactly `num_transactions` transactions
+    rng = np.random.default_rng(seed)
+    if num_families is None:
+        num_families = default_num_families(num_transactions)
+    families = [f"Family{i:04d}" for i in range(num_families)]
+
+    # Zipf-like family weights, a part of the families only has empty addresses
+    weights = 1.0 / np.arange(1, num_families + 1) ** 1.1
+    non_empty = max(1, int(num_families * (1 - EMPTY_FAMILY_FRACTION)))
+    weights[non_empty:] = 0.0
+    cumulative_weights = np.cumsum(weights / weights.sum())
+
+    remaining = num_transactions
+    record_index = 0
+    while remaining > 0:
+        if rng.random() < EMPTY_ADDRESS_FRACTION:
+            family = families[int(rng.integers(0, num_families))]
+            count = 0
+        else:
+            family = families[min(int(np.searchsorted(cumulative_weights, rng.random(), side="right")), non_empty - 1)]
+            count = min(remaining, int(rng.geometric(1 / MEAN_TRANSACTIONS_PER_ADDRESS)))
+
+        # Skewed towards the later years (the square root of a uniform number)
+        start = FIRST_TIME + (LAST_TIME - FIRST_TIME) * math.sqrt(rng.random())
+        times = np.minimum(start + np.cumsum(rng.exponential(7 * 86400, count)), LAST_TIME).astype(np.int64)
+        amounts = np.maximum(1, rng.lognormal(math.log(0.05 * BITCOIN_FACTOR), 2.0, count)).astype(np.int64)
+        amounts_usd = amounts / BITCOIN_FACTOR * btc_price(times)
+
+        transactions = []
+        for i in range(count):
+            digest = hashlib.sha256(f"{seed}:{record_index}:{i}".encode()).hexdigest()
+            transactions.append({"hash": digest, "time": int(times[i]), "amount": int(amounts[i]), "amountUSD": float(amounts_usd[i])})
+        created = int(start) - 86400
+        updated = int(times[-1]) if count > 0 else created
+        yield {"address": _address(rng), "family": family, "createdAt": _iso(created), "updatedAt": _iso(updated), "transactions": transactions}
+
+        remaining -= count
+        record_index += 1
+
+
+def write_export(path, num_transactions, seed=0, num_families=None):
+    # Writes the synthetic export (a top-level JSON array, like `jq --indent 0 '.result'`), returns the number of records
+    num_records = 0
+    with open(path, "w") as file:
+        file.write("[")
+        for record in generate_records(num_transactions, seed, num_families):
+            if num_records > 0:
+                file.write(",")
+            file.write(json.dumps(record, separators=(",", ":")))
+            num_records += 1
+        file.write("]\n")
+    return num_records
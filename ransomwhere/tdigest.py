@@ -0,0 +1,129 @@
+# t-digest sketches for quantiles of the ransom sizes (see StatsEngine with `quantile_compression`).
+#
+# The payments are very skewed, so the means of run_stats.sh say little about a typical ransom. A t-digest summarizes
+# the distribution of a stream of values with a bounded number of centroids (mean, weight): the centroids are small
+# near the tails (q close to 0 or 1) and large in the middle, so the high quantiles (p99) stay accurate.
+# The digests are mergeable (the union of the centroids is compressed again), like the sums of the engine.
+#
+# The values are buffered and merged into the centroids in sorted batches (the "merging" t-digest with the k1 scale
+# function k(q) = compression / (2 pi) * asin(2q - 1), a centroid spans at most one unit of k).
+# As long as all values fit into the buffer, the quantiles are exact (linear interpolation between the sorted values,
+# the same as `numpy.quantile`), e.g. for months and families with few transactions. The minimum and the maximum are always exact.
+# Only the standard library is used, so the engine works without NumPy.
+
+import math
+from itertools import repeat
+
+
+DEFAULT_COMPRESSION = 200  # Roughly 120 centroids, p99 within a few percent for the heavy-tailed payments
+BUFFER_FACTOR = 2  # The buffer is merged into the centroids when it holds `BUFFER_FACTOR * compression` values
+
+
+def _k(q, compression):
+    return compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+
+def _q(k, compression):
+    if k >= compression / 4:
+        return 1.0
+    return (math.sin(2 * math.pi * k / compression) + 1) / 2
+
+
+class TDigest:
+
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = []  # Sorted
+        self.weights = []
+        self.buffer = []
+        self.buffer_size = BUFFER_FACTOR * compression
+        self.count = 0
+        self.min = None  # Of the values merged into the centroids, not of the buffer
+        self.max = None
+
+    def add(self, value):
+        # Called for every transaction, the buffer is sorted and merged only once in a while
+        self.buffer.append(value)
+        self.count += 1
+        if len(self.buffer) >= self.buffer_size:
+            self._compress()
+
+    def _compress(self, centroids=()):
+        # Merges the buffer (and other centroids) into the centroids in one sorted sweep
+        if not self.buffer and not centroids:
+            return
+        points = sorted([*zip(self.means, self.weights), *zip(self.buffer, repeat(1)), *centroids])
+        self.buffer = []
+        total = sum(weight for _, weight in points)
+        self.min = points[0][0] if self.min is None else min(self.min, points[0][0])
+        self.max = points[-1][0] if self.max is None else max(self.max, points[-1][0])
+
+        means = []
+        weights = []
+        merged_weight = 0  # The weight of the finished centroids
+        mean, weight = points[0]
+        compression = self.compression
+        limit = total * _q(_k(0, compression) + 1, compression)
+        for point_mean, point_weight in points[1:]:
+            if merged_weight + weight + point_weight <= limit:
+                weight += point_weight
+                mean += (point_mean - mean) * point_weight / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                merged_weight += weight
+                limit = total * _q(_k(merged_weight / total, compression) + 1, compression)
+                mean, weight = point_mean, point_weight
+        means.append(mean)
+        weights.append(weight)
+        self.means = means
+        self.weights = weights
+
+    def merge(self, other):
+        # The union of both digests (in place), the compression of this digest is kept
+        if other.count == 0:
+            return self
+        self.count += other.count
+        if other.means:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        self.buffer.extend(other.buffer)
+        if other.means or len(self.buffer) >= self.buffer_size:
+            self._compress(list(zip(other.means, other.weights)))
+        return self
+
+    def maximum(self):
+        # The exact maximum, None for an empty digest
+        values = self.buffer if self.max is None else [*self.buffer, self.max]
+        return max(values) if values else None
+
+    def quantile(self, q):
+        # Returns the estimate of the q-quantile (0 <= q <= 1), None for an empty digest
+        if self.count == 0:
+            return None
+        if not self.means:
+            # All values are still in the buffer: exact linear interpolation between the sorted values
+            values = sorted(self.buffer)
+            position = q * (len(values) - 1)
+            i = min(int(position), len(values) - 2)
+            if i < 0:
+                return values[0]
+            return values[i] + (position - i) * (values[i + 1] - values[i])
+        self._compress()
+        means = self.means
+        weights = self.weights
+
+        # The centroid i is centered at the cumulative weight `cumulative + weights[i] / 2`,
+        # the minimum and the maximum are at the weights 0 and count
+        target = q * self.count
+        if target <= weights[0] / 2:
+            return self.min + (means[0] - self.min) * target / (weights[0] / 2)
+        cumulative = 0
+        for i in range(len(means) - 1):
+            center = cumulative + weights[i] / 2
+            next_center = cumulative + weights[i] + weights[i + 1] / 2
+            if target <= next_center:
+                return means[i] + (means[i + 1] - means[i]) * (target - center) / (next_center - center)
+            cumulative += weights[i]
+        center = self.count - weights[-1] / 2
+        return means[-1] + (self.max - means[-1]) * (target - center) / (self.count - center)
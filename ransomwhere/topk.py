@@ -0,0 +1,53 @@
+# Top K ransomware families by several metrics at once (compute_top_families.sh sorts the whole table once per metric).
+#
+# The totals per family are accumulated in one pass over the transactions, then every family is pushed once
+# into a bounded heap per metric (a min-heap of at most K families), so the table is never sorted.
+# The order is the same as `sort -t, -kN,N -rn` (or -rg) in compute_top_families.sh: by the printed value,
+# families with equal values are ordered by the whole line (descending, see collation_key).
+
+import heapq
+
+from ransomwhere import BITCOIN_FACTOR
+from ransomwhere.engine import collation_key
+
+
+TOP_FAMILIES_HEADER = "Family,Count,Sum (BTC),Sum (USD)"
+TOP_FAMILIES_FORMAT = "%s,%d,%f,%.2f"
+
+# Metric -> (the column of the row, the title in compute_top_families.sh)
+METRICS = {
+    "count": (1, "the number of transactions"),
+    "btc": (2, "the payment sum in BTC"),
+    "usd": (3, "the payment sum in USD"),
+}
+
+
+def family_totals(records):
+    # Rows: (family, count, sum_btc, sum_usd), the same as `compute_stats` in compute_top_families.sh
+    totals = dict()
+    for record in records:
+        family = record["family"]
+        for transaction in record["transactions"]:
+            total = totals.get(family)
+            if total is None:
+                total = totals[family] = [0, 0, 0.0]
+            total[0] += 1
+            total[1] += transaction["amount"]  # Exact sum in Satoshi
+            total[2] += transaction["amountUSD"]
+    return [(family, count, satoshi / BITCOIN_FACTOR, sum_usd) for family, (count, satoshi, sum_usd) in totals.items()]
+
+
+def top_k(rows, k, metrics=tuple(METRICS)):
+    # Returns {metric: [row, ...]} with the top `k` rows for every metric (in descending order)
+    heaps = {metric: [] for metric in metrics}
+    for row in rows:
+        family, count, sum_btc, sum_usd = row
+        printed = (family, count, float("%f" % sum_btc), float("%.2f" % sum_usd))  # Compared as printed, like `sort` does
+        line_key = collation_key(TOP_FAMILIES_FORMAT % row)
+        for metric, heap in heaps.items():
+            entry = (printed[METRICS[metric][0]], line_key, row)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+    return {metric: [row for *_, row in sorted(heap, key=lambda entry: entry[:2], reverse=True)] for metric, heap in heaps.items()}
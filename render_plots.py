@@ -0,0 +1,17 @@
+#!/usr/bin/env python
+#
+# This script renders all plots into png files without opening any windows (e.g. on a server):
+# timeline_months.png, timeline_top_families.png, timeline_families_{small,medium,large}.png and timeline_families_heatmap.png.
+# The input files timeline_months.csv and timeline_families.csv are computed by run_stats.sh (or run_stats.py).
+# The figures are rendered in parallel and the wall time of each figure is reported.
+# Figures whose data and parameters did not change since an earlier run are copied from the render cache
+# (output/.render_cache, see ransomwhere/render.py) instead of being rendered again.
+#
+# The same as `python -m ransomwhere render-plots` (see ransomwhere/cli.py).
+
+
+from ransomwhere.cli import run_command
+
+
+if __name__ == "__main__":
+    run_command("render-plots")
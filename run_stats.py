@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+#
+# This script computes the same statistics as run_stats.sh, but it reads the JSON file from the Ransomwhere website only once.
+# To download the file you can run: curl -sL "https://api.ransomwhe.re/export" | jq --indent 0 '.result' > data.json
+#
+# The computed statistics (see run_stats.sh for the details) are printed and saved into the files
+# timeline_years.csv, timeline_months.csv and timeline_families.csv (in the current directory).
+# The csv files are identical to the ones written by run_stats.sh.
+#
+# With --cache, the JSON file is converted once into a columnar binary cache (data.json.cache/ by default),
+# which is memory-mapped by later runs instead of parsing the JSON file again (see ransomwhere/cache.py).
+#
+# With --workers N (implies --cache), the statistics per family are aggregated by N processes in parallel
+# (see ransomwhere/parallel.py).
+#
+# With --parse-workers N (without the cache), the JSON file itself is split into ranges of records that are parsed by
+# N processes, the partial statistics are merged in the order of the file (see ransomwhere/chunks.py).
+#
+# With --state, the aggregates are saved into a state file and only the changed address records of the next export
+# are folded into them (see ransomwhere/incremental.py). The USD sums are then exact decimal sums.
+#
+# With --approximate-addresses, the used and known addresses in the timeline of families are estimated with HyperLogLog
+# sketches (see ransomwhere/hll.py) instead of exact sets of addresses, e.g. for merged exports with millions of addresses.
+# The relative standard error of the estimates is set with --address-error (0.01 by default).
+#
+# With --quantiles, the median, p90, p99 and maximum of the ransom sizes are estimated with t-digests in the same pass
+# (see ransomwhere/tdigest.py) and saved into quantiles_years.csv, quantiles_months.csv and quantiles_families.csv.
+#
+# With --database, the JSON file is loaded once into a SQLite database (data.json.sqlite by default) and the statistics
+# are read from its precomputed rollup tables by later runs (see ransomwhere/database.py and export_database.py).
+#
+# The same as `python -m ransomwhere stats` (see ransomwhere/cli.py).
+
+
+from ransomwhere.cli import run_command
+
+
+if __name__ == "__main__":
+    run_command("stats")
@@ -2,6 +2,7 @@
 #
 # This script is the main script to compute statistics on a JSON file from the Ransomwhere website (https://api.ransomwhe.re/export).
 # To download the file you can run: curl -sL "https://api.ransomwhe.re/export" | jq --indent 0 '.result' > data.json
+# The file can also be compressed with gzip, bzip2 or xz (e.g. data.json.gz), it is then decompressed as a stream.
 #
 # The computed statistics include:
 # - General statistics (total number of transactions, payment sum in BTC and USD, mean ransom sizes, time range, addresses, etc.)
@@ -19,6 +20,10 @@
 # Furthermore, for each family the totals for the corresponding statistics are also computed.
 #   Note: for totals the used addresses are equal to the known addresses (we know all addresses the family has used).
 # See below in the script for the lines regarding removing totals and saving the output to a csv file.
+#
+# With --profile (the first argument), the wall time, the CPU time (user and system, including the child processes)
+# and the peak memory of every stage are saved into profile.json (next to the csv files). The memory is the total RSS
+# of the processes of the script, sampled every 0.05 s, so it shows which of jq, sort, awk or column is the hot stage.
 
 
 set -euo pipefail
@@ -29,9 +34,120 @@ umask 077
 # The Bitcoin amounts in Ransomwhere dataset are in Satoshi
 BITCOIN_FACTOR=100000000
 
+# The report of the stages for --profile
+PROFILE_FILE="profile.json"
+PROFILE_INTERVAL=0.05
+
 function usage() {
-    echo -e "Usage: $0 data.json\n"
+    echo -e "Usage: $0 [--profile] data.json\n"
     echo -e "\tdata.json - the current up-to-date version of the dataset (available on: https://api.ransomwhe.re/export)"
+    echo -e "\t--profile - save the wall time, the CPU time and the peak memory of every stage into $PROFILE_FILE"
+}
+
+function profile_sample_memory() {
+    # Appends the time and the total RSS (in KiB) of the script and its child processes (except the sampler) to the file $1
+    local sampler="$BASHPID"
+    while true; do
+        ps -eo pid=,ppid=,rss= | awk -v root="$$" -v sampler="$sampler" -v now="$EPOCHREALTIME" '
+            {
+                parent[$1] = $2;
+                rss[$1] = $3;
+            }
+            END {
+                for (pid in parent) {
+                    # Walk up to the script, the processes of the sampler (and the other processes) are skipped
+                    p = pid;
+                    while (p != root && p != sampler && p in parent) {
+                        p = parent[p];
+                    }
+                    if (p == root) {
+                        total += rss[pid];
+                    }
+                }
+                printf("%s %d\n", now, total);
+            }' >> "$1"
+        sleep "$PROFILE_INTERVAL"
+    done
+}
+
+function profile_cpu_times() {
+    # Prints the user and system CPU time (in seconds) of the script and its finished child processes
+    # Expects the output of `times` in the file $1 (in a pipeline or in $(...), `times` would only see the subshell)
+    awk '
+        function seconds(t) {
+            split(t, parts, /[ms]/);
+            return parts[1] * 60 + parts[2];
+        }
+        {
+            user_time += seconds($1);
+            system_time += seconds($2);
+        }
+        END {
+            printf("%.3f %.3f\n", user_time, system_time);
+        }' "$1"
+}
+
+function profile_start() {
+    # Expects the name of the stage, stages can be nested (e.g. general_stats and general_stats.total_transactions)
+    $profile || return 0
+    times > "$profile_dir/times"
+    profile_started[$1]="$EPOCHREALTIME $(profile_cpu_times "$profile_dir/times")"
+}
+
+function profile_end() {
+    # Expects the name of the stage started by profile_start
+    $profile || return 0
+    times > "$profile_dir/times"
+    local end="$EPOCHREALTIME $(profile_cpu_times "$profile_dir/times")"
+    echo "$1 ${profile_started[$1]} $end" |
+        awk -v samples="$profile_dir/memory" '
+            {
+                stage = $1;
+                start = $2;
+                end = $5;
+                peak = 0;
+                while ((getline line < samples) > 0) {
+                    split(line, sample, " ");
+                    if (sample[1] >= start && sample[1] <= end && sample[2] > peak) {
+                        peak = sample[2];
+                    }
+                }
+                printf("%s\t%.3f\t%.3f\t%.3f\t%d\n", stage, end - start, $6 - $3, $7 - $4, peak);
+            }' >> "$profile_dir/stages"
+}
+
+function write_profile() {
+    # Expects the JSON file (data.json), writes the stages (in the order of their end) into profile.json
+    $profile || return 0
+    jq -R -s --arg script "$0" --arg data "$1" --arg interval "$PROFILE_INTERVAL" '
+        split("\n") | map(select(length > 0) | split("\t") | {
+            stage: .[0],
+            wall_time: (.[1] | tonumber),
+            user_time: (.[2] | tonumber),
+            system_time: (.[3] | tonumber),
+            peak_rss_kib: (.[4] | tonumber)
+        }) | { script: $script, data: $data, memory_sampling_interval: ($interval | tonumber), stages: . }' "$profile_dir/stages" > "$PROFILE_FILE"
+}
+
+function detect_compression() {
+    # Prints the compression of the file $1 (gzip, bzip2 or xz) detected from its first bytes, nothing for a plain file
+    case $(head -c 6 "$1" | od -An -tx1 | tr -d ' \n') in
+        1f8b*) echo "gzip" ;;
+        425a68*) echo "bzip2" ;;
+        fd377a585a00) echo "xz" ;;
+    esac
+}
+
+function jq_data() {
+    # Runs jq with the remaining arguments on the JSON file $1
+    # A compressed file is decompressed as a stream into jq (no uncompressed copy), see data_compression below
+    local data="$1"
+    shift
+    if [[ -n "$data_compression" ]]; then
+        "$data_compression" -dc "$data" | jq "$@"
+    else
+        jq "$@" "$data"
+    fi
 }
 
 function print_title() {
@@ -56,24 +172,41 @@ function print_general_stats() {
     # Expects the full JSON file (data.json)
 
     print_title "Total number of transactions"
-    print_result $(jq '.[].transactions | length' "$1" | paste -d '+' -s | bc | awk '{ printf("%d\n", $1); }')
+    profile_start "general_stats.total_transactions"
+    print_result $(jq_data "$1" '.[].transactions | length' | awk '{ count += $1; } END { printf("%d\n", count); }')
+    profile_end "general_stats.total_transactions"
 
     print_title "Total payment sum (BTC)"
-    print_result $(jq '.[].transactions.[].amount' "$1" | paste -d '+' -s | bc | awk -v bitcoin_factor="$BITCOIN_FACTOR" '{ printf("%f\n", $1 / bitcoin_factor); }')
+    profile_start "general_stats.total_btc"
+    # The amounts are summed in Satoshi (integers, exact) and only the sum is converted to BTC
+    print_result $(jq_data "$1" '.[].transactions.[].amount' | awk -v bitcoin_factor="$BITCOIN_FACTOR" '{ sum_satoshi += $1; } END { printf("%f\n", sum_satoshi / bitcoin_factor); }')
+    profile_end "general_stats.total_btc"
+
+    # The USD sum and the means are computed in one pass over the amounts (the first and the second line of the output)
+    profile_start "general_stats.total_usd_and_means"
+    usd_and_means=$(jq_data "$1" -r '.[] | .transactions.[] | { amount: .amount, amountUSD: .amountUSD } | [ .amount, .amountUSD] | @csv' | awk -F, -v bitcoin_factor="$BITCOIN_FACTOR" '{ sumSatoshi += $1; sumUSD += $2; count += 1;} END { printf("%.2f\n", sumUSD); printf("Mean (BTC): %f, Mean (USD): %.2f\n", sumSatoshi / bitcoin_factor / count, sumUSD / count); }')
+    profile_end "general_stats.total_usd_and_means"
 
     print_title "Total payment sum (USD)"
-    print_result $(jq '.[].transactions.[].amountUSD' "$1" | paste -d '+' -s | bc | awk '{ printf("%.2f\n", $1); }')
+    print_result "${usd_and_means%%$'\n'*}"
 
     print_title "Means for ransom sizes (BTC, USD)"
-    print_result $(jq -r '.[] | .transactions.[] | { amount: .amount, amountUSD: .amountUSD } | [ .amount, .amountUSD] | @csv' "$1" | awk -F, -v bitcoin_factor="$BITCOIN_FACTOR" '{ sumBTC += $1 / bitcoin_factor; sumUSD += $2; count += 1;} END { printf("Mean (BTC): %f, Mean (USD): %.2f\n", sumBTC / count, sumUSD / count); }')
+    print_result "${usd_and_means#*$'\n'}"
 
     print_title "Time range of transactions"
-    transactions=$(jq '.[].transactions.[].time' "$1" |
-                    awk '{ $1 = strftime("%Y-%m-%d %H:%M:%S", $1); print $0; }' | sort |
-                    awk 'NR == 1 { print "First transaction: " $0; }; END { print "Last transaction: " $0; }')
+    profile_start "general_stats.time_range"
+    # Only the first and the last timestamp are formatted (instead of formatting and sorting all of them)
+    transactions=$(jq_data "$1" '.[].transactions.[].time' |
+                    awk 'NR == 1 || $1 < first { first = $1; } NR == 1 || $1 > last { last = $1; }
+                         END { if (NR > 0) { print "First transaction: " strftime("%Y-%m-%d %H:%M:%S", first); print "Last transaction: " strftime("%Y-%m-%d %H:%M:%S", last); } }')
     print_result "$transactions"
+    profile_end "general_stats.time_range"
+
+    profile_start "general_stats.address_entries"
+    address_entries=$(jq_data "$1" -r '.[] | { address: .address, family: .family, createdAt: .createdAt, updatedAt: .updatedAt, trans: .transactions | length } | [ .address, .family, .createdAt, .updatedAt, .trans ] | @csv' | tr -d '"')
+    profile_end "general_stats.address_entries"
 
-    address_entries=$(jq -r '.[] | { address: .address, family: .family, createdAt: .createdAt, updatedAt: .updatedAt, trans: .transactions | length } | [ .address, .family, .createdAt, .updatedAt, .trans ] | @csv' "$1" | tr -d '"')
+    profile_start "general_stats.addresses_and_families"
     transactions=$(echo -e "$address_entries" | awk -F, '$NF != 0 { print $0 }')
     no_transactions=$(echo -e "$address_entries" | awk -F, '$NF == 0 { print $0 }')
 
@@ -86,6 +219,7 @@ function print_general_stats() {
     stats_families_with_empty_addresses=$(echo -e "$no_transactions" | cut -d, -f2 | sort | uniq -c | sort -rn | awk '{ print $2 ": " $1; }')
     stats_families_with_empty_addresses_one_line=$(echo -e "$stats_families_with_empty_addresses" | awk 'NR == 1 { printf("%s", $0); count++; } NR > 1 { printf(", %s", $0); count++; } END { printf(" (%d families in total)\n", count); }')
     empty_families=$(comm -13 <(echo -e "$non_empty_families") <(echo -e "$families_with_empty_addresses"))
+    profile_end "general_stats.addresses_and_families"
 
     print_title "Total number of families"
     print_result $(echo -e "$total_families" | wc -l)
@@ -104,19 +238,25 @@ function print_general_stats() {
 function compute_timeline_years() {
     # Expects the full JSON file (data.json)
 
-    jq -r '.[] | .transactions.[] | [ .time, .amount, .amountUSD ] | @csv' "$1" |
+    jq_data "$1" -r '.[] | .transactions.[] | [ .time, .amount, .amountUSD ] | @csv' |
         awk -F, -v bitcoin_factor="$BITCOIN_FACTOR" '
             BEGIN {
                 printf("Year,Count,Sum (BTC),Sum (USD),Average (BTC),Average (USD)\n");
             }
             {
-                $1 = strftime("%Y", $1);
+                # strftime is called once per day (not per transaction), the days do not cross years in UTC
+                day = int($1 / 86400);
+                if (!(day in year_of_day)) {
+                    year_of_day[day] = strftime("%Y", $1);
+                }
+                $1 = year_of_day[day];
                 count[$1] += 1;
-                sum_btc[$1] += $2 / bitcoin_factor;
+                sum_satoshi[$1] += $2;  # Exact integer sums, converted to BTC at the end
                 sum_usd[$1] += $3;
             }
             END {
                 for (year in count) {
+                    sum_btc[year] = sum_satoshi[year] / bitcoin_factor;
                     avg_btc = sum_btc[year] / count[year];
                     avg_usd = sum_usd[year] / count[year];
                     fmt_str = "%s,%d,%f,%.2f,%f,%.2f\n";
@@ -137,18 +277,24 @@ function print_timeline_years() {
 function compute_timeline_months() {
     # Expects the full JSON file (data.json)
 
-    jq -r '.[] | .transactions.[] | [ .time, .amount, .amountUSD ] | @csv' "$1" |
+    jq_data "$1" -r '.[] | .transactions.[] | [ .time, .amount, .amountUSD ] | @csv' |
         awk -F, -v bitcoin_factor="$BITCOIN_FACTOR" '
             BEGIN {
                 printf("Month,Count,Sum (BTC),Sum (USD),Average (BTC),Average (USD)\n");
             }
             {
-                $1 = strftime("%Y-%m", $1);
+                # strftime is called once per day (not per transaction), the days do not cross months in UTC
+                day = int($1 / 86400);
+                if (!(day in month_of_day)) {
+                    month_of_day[day] = strftime("%Y-%m", $1);
+                }
+                $1 = month_of_day[day];
                 count[$1] += 1;
-                sum_btc[$1] += $2 / bitcoin_factor;
+                sum_satoshi[$1] += $2;  # Exact integer sums, converted to BTC at the end
                 sum_usd[$1] += $3;
             } END {
                 for (month in count) {
+                    sum_btc[month] = sum_satoshi[month] / bitcoin_factor;
                     avg_btc = sum_btc[month] / count[month];
                     avg_usd = sum_usd[month] / count[month];
                     fmt_str =  "%s,%d,%f,%.2f,%f,%.2f\n";
@@ -170,7 +316,7 @@ function print_timeline_months() {
 function compute_timeline_families() {
     # Expects the full JSON file (data.json)
 
-    jq -r '.[] | .family as $family | .address as $address | .transactions[] | [$family, .time, $address, .amount, .amountUSD] | @csv' "$1" | tr -d '"' |
+    jq_data "$1" -r '.[] | .family as $family | .address as $address | .transactions[] | [$family, .time, $address, .amount, .amountUSD] | @csv' | tr -d '"' |
         sort -t, -k1,1 -k2,2 |  # Sorting is very important here for the dates and families
         awk -F, -v bitcoin_factor="$BITCOIN_FACTOR" '
             BEGIN {
@@ -180,14 +326,18 @@ function compute_timeline_families() {
                 # More on 2d arrays: https://www.gnu.org/software/gawk/manual/html_node/Multidimensional.html
                 # Format:    Family, Timestamp,                           Address   BTC,               USD
                 # Example: WannaCry,1632310212,12t9YDPgwueZ9NyMgw519p7AA8isjr6SMw,26346,11.480139828412979
-                $2 = strftime("%Y-%m", $2);  # Convert the date
+                # Convert the date (strftime is called once per day, not per transaction)
+                day = int($2 / 86400);
+                if (!(day in month_of_day)) {
+                    month_of_day[day] = strftime("%Y-%m", $2);
+                }
+                $2 = month_of_day[day];
                 count[$1,$2] += 1;
-                btc = $4 / bitcoin_factor;
                 usd = $5;
-                sum_btc[$1,$2] += btc;
+                sum_satoshi[$1,$2] += $4;  # Exact integer sums, converted to BTC at the end
                 sum_usd[$1,$2] += usd;
                 total_count[$1] += 1;
-                total_sum_btc[$1] += btc;
+                total_sum_satoshi[$1] += $4;
                 total_sum_usd[$1] += usd;
                 last_month[$1] = $2;
 
@@ -213,7 +363,7 @@ function compute_timeline_families() {
                     family = separate[1];
                     month = separate[2];
                     count_family = count[family,month];
-                    sum_btc_family = sum_btc[family,month];
+                    sum_btc_family = sum_satoshi[family,month] / bitcoin_factor;
                     sum_usd_family = sum_usd[family,month];
                     used_addresses_family = used_addresses_month[family,month];
                     known_addresses_family = known_addresses[family,month];
@@ -223,7 +373,7 @@ function compute_timeline_families() {
                     # Print the total values
                     if (month == last_month[family]) {
                         # Here total used addresses and total known addresses are the same (we know all addresses they have used)
-                        printf(fmt_str, family, "Total", total_count[family], total_sum_btc[family], total_sum_usd[family], known_addresses_family, known_addresses_family);
+                        printf(fmt_str, family, "Total", total_count[family], total_sum_satoshi[family] / bitcoin_factor, total_sum_usd[family], known_addresses_family, known_addresses_family);
                     }
                 }
             }' |
@@ -243,17 +393,26 @@ function print_transactions_for_family() {
     # Expects the full JSON file (data.json) and the ransomware family of interest
 
     print_title "$2:"
-    result=$(jq -r '.[] | { address: .address, family: .family, trans: .transactions | length } | [ .address, .family, .trans ] | @csv' "$1" | tr -d '"' | awk -F, -v family="$2" '$2 == family { print $0; }' | awk -F, '!visited[$1]++ { addresses += 1; } { sum += $3; } END { printf("Unique addresses: %d\nNumber of transactions: %d\n", addresses, sum); }')
+    result=$(jq_data "$1" -r '.[] | { address: .address, family: .family, trans: .transactions | length } | [ .address, .family, .trans ] | @csv' | tr -d '"' | awk -F, -v family="$2" '$2 == family { print $0; }' | awk -F, '!visited[$1]++ { addresses += 1; } { sum += $3; } END { printf("Unique addresses: %d\nNumber of transactions: %d\n", addresses, sum); }')
     print_misc "$result"
 }
 
 
-# Check if exactly one argument has been provided
+profile=false
+if [[ $# -eq 2 && "$1" == "--profile" ]]; then
+    profile=true
+    shift
+fi
+
+# Check if exactly one argument has been provided (besides --profile)
 [[ $# -ne 1 ]] && { usage >&2 ; exit 1; }
 
 # Check if the provided file exists
 [[ -f "$1" ]] || { echo "File $1 does not exist." >&2 ; exit 1; }
 
+# The data can be compressed with gzip, bzip2 or xz (see jq_data)
+data_compression=$(detect_compression "$1")
+
 # Transaction timestamps are in UTC
 export TZ="UTC"
 # For consistent sorting
@@ -261,33 +420,66 @@ export LC_ALL=en_US.UTF-8
 
 data="$1"
 
+if $profile; then
+    declare -A profile_started
+    profile_dir=$(mktemp -d)
+    touch "$profile_dir/memory" "$profile_dir/stages"
+    profile_sample_memory "$profile_dir/memory" &
+    profile_sampler=$!
+    trap 'kill "$profile_sampler" 2> /dev/null; rm -rf "$profile_dir"' EXIT
+    profile_start "total"
+fi
 
 echo -e "\e[1;92mWelcome to $0! How about this? \e[0m"
 
 # Print general statistics: total number of addresses, total number of transactions, total payment sum (BTC and USD) etc.
+profile_start "general_stats"
 print_general_stats "$data"
+profile_end "general_stats"
 
 # Print the payment timeline per year
+profile_start "timeline_years.compute"
 timeline_years=$(compute_timeline_years "$data")
+profile_end "timeline_years.compute"
+profile_start "timeline_years.print"
 print_timeline_years "$timeline_years"
+profile_end "timeline_years.print"
+profile_start "timeline_years.write_csv"
 echo -e "$timeline_years" > timeline_years.csv
+profile_end "timeline_years.write_csv"
 
 # Print the payment timeline per month
+profile_start "timeline_months.compute"
 timeline_months=$(compute_timeline_months "$data")
+profile_end "timeline_months.compute"
+profile_start "timeline_months.print"
 print_timeline_months "$timeline_months"
+profile_end "timeline_months.print"
+profile_start "timeline_months.write_csv"
 echo -e "$timeline_months" > timeline_months.csv
+profile_end "timeline_months.write_csv"
 
 # Print the timeline of ransomware families per month
+profile_start "timeline_families.compute"
 timeline_families=$(compute_timeline_families "$data")
 # Remove "Total" (if needed)
 timeline_families=$(echo -e "$timeline_families" | awk -F, '$2 != "Total" { print $0; }')
+profile_end "timeline_families.compute"
+profile_start "timeline_families.print"
 print_timeline_families "$timeline_families"
+profile_end "timeline_families.print"
+profile_start "timeline_families.write_csv"
 echo -e "$timeline_families" > timeline_families.csv
+profile_end "timeline_families.write_csv"
 
 # Print the number of transactions and the number of addresses for a family of choice
+# (query_families.py answers the same for any number of families from an index, without parsing data.json again)
 # print_transactions_for_family "$data" "Locky"
 # print_transactions_for_family "$data" "Conti"
 # print_transactions_for_family "$data" "WannaCry"
 
+profile_end "total"
+write_profile "$data"
+
 echo -e "\e[1;95mThis script has been sponsored by Smaragdakis et al.!\e[0m"
 echo -e "\e[1;95mHave a nice day!\e[0m"
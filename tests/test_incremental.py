@@ -0,0 +1,73 @@
+# The incremental statistics (ransomwhere/incremental.py) must always agree with a full pass over the same export.
+
+from ransomwhere.engine import compute_stats
+from ransomwhere.incremental import IncrementalStats, load_state, save_state
+
+
+def transaction(hash, time, amount, amount_usd):
+    return {"hash": hash, "time": time, "amount": amount, "amountUSD": amount_usd}
+
+
+def record(family, address, updated_at, transactions):
+    return {"address": address, "family": family, "createdAt": "2021-01-01T00:00:00.000Z", "updatedAt": updated_at,
+            "transactions": transactions}
+
+
+def statistics(engine):
+    return (engine.general_stats(), engine.timeline_years(), engine.timeline_months(),
+            engine.timeline_families(totals=True), sorted(engine.top_families_stats()))
+
+
+def assert_same_as_full_pass(engine, records):
+    assert statistics(engine) == statistics(compute_stats(records))
+
+
+FIRST_EXPORT = [
+    record("Locky", "A", "2021-01-01", [transaction("h1", 1609459200, 100000000, 300.5)]),
+    record("Conti", "B", "2021-02-01", [transaction("h2", 1612137600, 50000000, 20.25)]),
+    record("Conti", "C", "2021-02-01", []),
+]
+
+
+def test_first_update_is_a_full_pass():
+    engine = IncrementalStats()
+    assert engine.update(FIRST_EXPORT) == (2, 3, 0)
+    assert_same_as_full_pass(engine, FIRST_EXPORT)
+
+
+def test_changed_family():
+    # Address A moved from Locky to WannaCry, Locky is not in the export anymore
+    engine = IncrementalStats()
+    engine.update(FIRST_EXPORT)
+    second_export = [record("WannaCry", "A", "2021-03-01", FIRST_EXPORT[0]["transactions"])] + FIRST_EXPORT[1:]
+    assert engine.update(second_export) == (1, 1, 1)
+    assert_same_as_full_pass(engine, second_export)
+    assert engine.general_stats().num_families == 2
+    assert [row[0] for row in engine.timeline_families()] == ["Conti", "Conti", "WannaCry", "WannaCry"]
+
+
+def test_duplicate_record():
+    # Every address record is counted, like in a full pass
+    export = FIRST_EXPORT + [FIRST_EXPORT[1]]
+    engine = IncrementalStats()
+    engine.update(export)
+    assert engine.general_stats().num_transactions == 3
+    assert_same_as_full_pass(engine, export)
+
+    # The duplicate is removed again
+    assert engine.update(FIRST_EXPORT) == (0, 0, 1)
+    assert_same_as_full_pass(engine, FIRST_EXPORT)
+
+
+def test_new_transaction(tmp_path):
+    engine = IncrementalStats()
+    engine.update(FIRST_EXPORT)
+    path = tmp_path / "stats.state"
+    save_state(engine, path)
+
+    transactions = FIRST_EXPORT[1]["transactions"] + [transaction("h3", 1617235200, 25000000, 12.75)]
+    second_export = [FIRST_EXPORT[0], record("Conti", "B", "2021-04-01", transactions), FIRST_EXPORT[2]]
+    engine = load_state(path)
+    assert engine.update(second_export) == (1, 1, 0)
+    assert_same_as_full_pass(engine, second_export)
+    assert engine.general_stats().last_time == 1617235200